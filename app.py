@@ -1,19 +1,36 @@
 import streamlit as st
 from pathlib import Path
-import whisper
-import tempfile
-import os
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict, List, Tuple
 import time
 from streamlit_mic_recorder import mic_recorder
+import queue
+import numpy as np
 import datetime
 import streamlit.components.v1 as components
-import requests
 import json
+import uuid
+from transcriber import AudioTranscriber, DECODE_OPTIONS, SUPPORTED_FORMATS
+from transcript_cache import audio_hash, get_cache, make_key
+from job_queue import DONE, FAILED, JOB_POLL_SECONDS, JOB_WORKERS, QUEUED, RUNNING, JobQueue, get_queue, index_result
+from audio_io import SAMPLE_RATE
+from session_memory import get_session_memory
+from language_id import AUTO, decode_languages
+from ingest import SESSION_SPOOL_MB, convert_for_spool, ingest
+from discord_delivery import send_async
+from concurrent.futures import Future
+from streaming import StreamingTranscriber, Word, words_to_segment
+from model_policy import Decision, decide, models_at_least
+from transcript_store import EXPORT_FORMATS, TranscriptStore, format_timestamp
+from metrics import recent_traces, render_prometheus, stage, start_http_server, trace
+from search_index import get_search_index
+from warmup import FAILED as MODEL_FAILED, READY as MODEL_READY, readiness, start_warmup
+
+try:
+    import av
+    from streamlit_webrtc import WebRtcMode, webrtc_streamer
+except ImportError:
+    webrtc_streamer = None
 
-SUPPORTED_FORMATS = ['.mp3', '.m4a', '.wav', '.ogg', '.mp4']
-MODEL_NAME = "base"
-DISCORD_MESSAGE_LIMIT = 1900
 
 TRANSLATIONS = {
     'en': {
@@ -50,7 +67,30 @@ TRANSLATIONS = {
         'transcription_error': "Error transcribing file:",
         'processing_error': "Error processing",
         'chunked_error': "Error sending chunked messages:",
-        'part_prefix': "Part"
+        'part_prefix': "Part",
+        'live_mode': "Live transcription (transcribe while you speak)",
+        'live_instructions': "Press START and speak. Text is added to the transcript as soon as it is final; press STOP to finish the last sentence.",
+        'vad_skipped': "Skipped {skipped_seconds:.0f}s of {total_seconds:.0f}s as silence ({skipped_ratio:.0%})",
+        'chunk_progress': "Transcribed {done}/{total} chunks",
+        'job_queued': "Queued…",
+        'job_running': "Transcribing… {progress:.0%}",
+        'debug_panel': "Show performance details",
+        'recent_requests': "Recent requests (seconds per stage)",
+        'export_format': "Format",
+        'transcript_page': "Page",
+        'memory_footprint': "Memory footprint (bytes)",
+        'decode_language_selector': "Spoken language",
+        'auto_detect': "Detect automatically",
+        'detected_language': "Detected language: {language}",
+        'model_loading': "Loading the transcription model ({seconds}s)… Recordings and uploads are queued and start as soon as it is ready.",
+        'model_load_failed': "The transcription model could not be loaded: {error}",
+        'search_tab': "Search",
+        'search_query': "Search past transcripts",
+        'search_index_stats': "{transcripts} transcripts indexed ({hours} h of audio)",
+        'search_results': "{count} results in {ms:.0f} ms",
+        'search_no_results': "No transcript matches this search.",
+        'search_unavailable': "Search is unavailable: this SQLite build has no FTS5 support.",
+        'session_spool_exceeded': "Skipped {name}: this session already has {used} MB of audio waiting to be transcribed, and the limit is {limit} MB. Submit it again once those jobs finish."
     },
     'fr': {
         'title': "Modèle de Transcription Whisper",
@@ -86,7 +126,30 @@ TRANSLATIONS = {
         'transcription_error': "Erreur lors de la transcription du fichier :",
         'processing_error': "Erreur lors du traitement",
         'chunked_error': "Erreur lors de l'envoi de messages fragmentés :",
-        'part_prefix': "Partie"
+        'part_prefix': "Partie",
+        'live_mode': "Transcription en direct (transcrire pendant que vous parlez)",
+        'live_instructions': "Appuyez sur START et parlez. Le texte est ajouté à la transcription dès qu'il est définitif ; appuyez sur STOP pour terminer la dernière phrase.",
+        'vad_skipped': "{skipped_seconds:.0f} s sur {total_seconds:.0f} s ignorées comme silence ({skipped_ratio:.0%})",
+        'chunk_progress': "{done}/{total} segments transcrits",
+        'job_queued': "En attente…",
+        'job_running': "Transcription… {progress:.0%}",
+        'debug_panel': "Afficher les détails de performance",
+        'recent_requests': "Requêtes récentes (secondes par étape)",
+        'export_format': "Format",
+        'transcript_page': "Page",
+        'memory_footprint': "Empreinte mémoire (octets)",
+        'decode_language_selector': "Langue parlée",
+        'auto_detect': "Détection automatique",
+        'detected_language': "Langue détectée : {language}",
+        'model_loading': "Chargement du modèle de transcription ({seconds} s)… Les enregistrements et fichiers sont mis en file d'attente et traités dès qu'il est prêt.",
+        'model_load_failed': "Le modèle de transcription n'a pas pu être chargé : {error}",
+        'search_tab': "Recherche",
+        'search_query': "Rechercher dans les transcriptions",
+        'search_index_stats': "{transcripts} transcriptions indexées ({hours} h d'audio)",
+        'search_results': "{count} résultats en {ms:.0f} ms",
+        'search_no_results': "Aucune transcription ne correspond à cette recherche.",
+        'search_unavailable': "La recherche n'est pas disponible : cette version de SQLite ne prend pas en charge FTS5.",
+        'session_spool_exceeded': "{name} ignoré : cette session a déjà {used} Mo d'audio en attente de transcription, et la limite est de {limit} Mo. Soumettez-le à nouveau une fois ces tâches terminées."
     },
     'de': {
         'title': "Whisper Transkriptions-Modell",
@@ -122,7 +185,30 @@ TRANSLATIONS = {
         'transcription_error': "Fehler beim Transkribieren der Datei:",
         'processing_error': "Fehler beim Verarbeiten",
         'chunked_error': "Fehler beim Senden von fragmentierten Nachrichten:",
-        'part_prefix': "Teil"
+        'part_prefix': "Teil",
+        'live_mode': "Live-Transkription (während Sie sprechen)",
+        'live_instructions': "Drücken Sie START und sprechen Sie. Der Text wird zum Transkript hinzugefügt, sobald er feststeht; drücken Sie STOP, um den letzten Satz abzuschließen.",
+        'vad_skipped': "{skipped_seconds:.0f} s von {total_seconds:.0f} s als Stille übersprungen ({skipped_ratio:.0%})",
+        'chunk_progress': "{done}/{total} Abschnitte transkribiert",
+        'job_queued': "In der Warteschlange…",
+        'job_running': "Transkription… {progress:.0%}",
+        'debug_panel': "Leistungsdetails anzeigen",
+        'recent_requests': "Letzte Anfragen (Sekunden pro Schritt)",
+        'export_format': "Format",
+        'transcript_page': "Seite",
+        'memory_footprint': "Speicherbedarf (Bytes)",
+        'decode_language_selector': "Gesprochene Sprache",
+        'auto_detect': "Automatisch erkennen",
+        'detected_language': "Erkannte Sprache: {language}",
+        'model_loading': "Transkriptionsmodell wird geladen ({seconds} s)… Aufnahmen und Dateien werden eingereiht und verarbeitet, sobald es bereit ist.",
+        'model_load_failed': "Das Transkriptionsmodell konnte nicht geladen werden: {error}",
+        'search_tab': "Suche",
+        'search_query': "Frühere Transkriptionen durchsuchen",
+        'search_index_stats': "{transcripts} Transkriptionen indexiert ({hours} h Audio)",
+        'search_results': "{count} Treffer in {ms:.0f} ms",
+        'search_no_results': "Keine Transkription passt zu dieser Suche.",
+        'search_unavailable': "Die Suche ist nicht verfügbar: Dieser SQLite-Build unterstützt FTS5 nicht.",
+        'session_spool_exceeded': "{name} übersprungen: In dieser Sitzung warten bereits {used} MB Audio auf die Transkription, das Limit liegt bei {limit} MB. Reichen Sie die Datei erneut ein, sobald diese Aufträge fertig sind."
     },
     'es': {
         'title': "Modelo de Transcripción Whisper",
@@ -158,7 +244,30 @@ TRANSLATIONS = {
         'transcription_error': "Error transcribiendo archivo:",
         'processing_error': "Error procesando",
         'chunked_error': "Error enviando mensajes fragmentados:",
-        'part_prefix': "Parte"
+        'part_prefix': "Parte",
+        'live_mode': "Transcripción en vivo (transcribir mientras hablas)",
+        'live_instructions': "Pulsa START y habla. El texto se añade a la transcripción en cuanto es definitivo; pulsa STOP para terminar la última frase.",
+        'vad_skipped': "Se omitieron {skipped_seconds:.0f} s de {total_seconds:.0f} s como silencio ({skipped_ratio:.0%})",
+        'chunk_progress': "{done}/{total} fragmentos transcritos",
+        'job_queued': "En cola…",
+        'job_running': "Transcribiendo… {progress:.0%}",
+        'debug_panel': "Mostrar detalles de rendimiento",
+        'recent_requests': "Solicitudes recientes (segundos por etapa)",
+        'export_format': "Formato",
+        'transcript_page': "Página",
+        'memory_footprint': "Uso de memoria (bytes)",
+        'decode_language_selector': "Idioma hablado",
+        'auto_detect': "Detectar automáticamente",
+        'detected_language': "Idioma detectado: {language}",
+        'model_loading': "Cargando el modelo de transcripción ({seconds} s)… Las grabaciones y archivos se ponen en cola y se procesan en cuanto esté listo.",
+        'model_load_failed': "No se pudo cargar el modelo de transcripción: {error}",
+        'search_tab': "Buscar",
+        'search_query': "Buscar en transcripciones anteriores",
+        'search_index_stats': "{transcripts} transcripciones indexadas ({hours} h de audio)",
+        'search_results': "{count} resultados en {ms:.0f} ms",
+        'search_no_results': "Ninguna transcripción coincide con esta búsqueda.",
+        'search_unavailable': "La búsqueda no está disponible: esta versión de SQLite no admite FTS5.",
+        'session_spool_exceeded': "Se omitió {name}: esta sesión ya tiene {used} MB de audio esperando transcripción y el límite es de {limit} MB. Vuelva a enviarlo cuando terminen esos trabajos."
     }
 }
 
@@ -172,63 +281,39 @@ LANGUAGE_OPTIONS = {
 def get_text(key: str, lang: str) -> str:
     return TRANSLATIONS.get(lang, TRANSLATIONS['en']).get(key, key)
 
-class AudioTranscriber:
-    def __init__(self, model_name: str = MODEL_NAME):
-        self.model = whisper.load_model(model_name)
-    
-    def transcribe_file(self, input_path: str, language: str = "en") -> Optional[str]:
-        try:
-            result = self.model.transcribe(
-                input_path,
-                verbose=False,
-                task="transcribe",
-                language=language
-            )
-            return result["text"]
-        except Exception as e:
-            st.error(f"{get_text('transcription_error', st.session_state.language)} {str(e)}")
-            return None
-
-def send_to_discord(transcript: str, source: str = "transcription") -> bool:
+def send_to_discord(transcript: str, source: str = "transcription") -> Optional[Future]:
     webhook_url = st.secrets.get("DISCORD_WEBHOOK_URL")
     
     if not webhook_url:
         st.error(get_text('discord_webhook_error', st.session_state.language))
-        return False
+        return None
     
-    if len(transcript) <= DISCORD_MESSAGE_LIMIT:
-        return send_single_message(webhook_url, transcript)
-    else:
-        return send_chunked_messages(webhook_url, transcript)
+    return send_async(webhook_url, transcript, get_text('part_prefix', st.session_state.language))
 
-def send_single_message(webhook_url: str, message: str) -> bool:
-    try:
-        data = {"content": message}
-        response = requests.post(webhook_url, json=data, timeout=10)
-        return response.status_code == 204
-    except Exception as e:
-        st.error(f"{get_text('discord_send_error', st.session_state.language)} {str(e)}")
+def discord_button(transcript: str, source: str, key: str) -> bool:
+    if st.button(get_text('send_to_discord', st.session_state.language), key=key):
+        future = send_to_discord(transcript, source)
+        if future is not None:
+            st.session_state.discord_sends[key] = future
+    
+    future = st.session_state.discord_sends.get(key)
+    if future is None:
         return False
-
-def send_chunked_messages(webhook_url: str, transcript: str) -> bool:
-    try:
-        chunk_size = DISCORD_MESSAGE_LIMIT - 50
-        chunks = [transcript[i:i+chunk_size] for i in range(0, len(transcript), chunk_size)]
-        
-        for i, chunk in enumerate(chunks):
-            part_text = get_text('part_prefix', st.session_state.language)
-            message = f"**{part_text} {i+1}/{len(chunks)}:**\n{chunk}"
-            if not send_single_message(webhook_url, message):
-                return False
-            time.sleep(0.5)
-        
+    if not future.done():
+        st.info(get_text('sending_to_discord', st.session_state.language))
         return True
-    except Exception as e:
-        st.error(f"{get_text('chunked_error', st.session_state.language)} {str(e)}")
-        return False
+    
+    del st.session_state.discord_sends[key]
+    error = future.exception()
+    if error is None:
+        st.success(get_text('sent_to_discord', st.session_state.language))
+    else:
+        st.error(f"{get_text('failed_to_send', st.session_state.language)}: {error}")
+    return False
 
 def copy_to_clipboard_component(text: str, button_text: str):
-    escaped_text = text.replace('`', '\\`').replace('\\', '\\\\').replace('"', '\\"')
+    # A JSON string is a valid JS literal; "</" is split so the text cannot close the script tag.
+    text_literal = json.dumps(text).replace("</", "<\\/")
     copied_text = get_text('copied', st.session_state.language)
     
     copy_button_html = f"""
@@ -258,7 +343,7 @@ def copy_to_clipboard_component(text: str, button_text: str):
     
     <script>
     function copyToClipboard() {{
-        const text = `{escaped_text}`;
+        const text = {text_literal};
         
         if (navigator.clipboard && window.isSecureContext) {{
             navigator.clipboard.writeText(text).then(function() {{
@@ -303,89 +388,313 @@ def copy_to_clipboard_component(text: str, button_text: str):
     
     components.html(copy_button_html, height=50)
 
-def process_files(transcriber: AudioTranscriber, files) -> Dict[str, str]:
-    transcriptions = {}
+def copy_button(get_payload: Callable[[], str], key: str, version):
+    # The component carries the whole text in its HTML, so it is only rendered
+    # once asked for, and again only after the text has changed.
+    button_text = get_text('copy_to_clipboard', st.session_state.language)
+    if st.session_state.get(key) != version:
+        if st.button(button_text, key=f"{key}_prepare"):
+            st.session_state[key] = version
+            st.rerun()
+        return
+    copy_to_clipboard_component(get_payload(), button_text)
+
+def render_file_result(name: str, transcription: str, download_container, expander_container,
+                       vad_stats: Optional[Dict] = None):
+    with download_container:
+        st.download_button(
+            "Download",
+            transcription,
+            f"{Path(name).stem}_transcription.txt",
+            "text/plain",
+            key=f"download_{name}"
+        )
     
+    with expander_container:
+        with st.expander(f"Show transcription for {name}"):
+            if vad_stats and vad_stats['skipped_seconds'] > 0:
+                st.caption(get_text('vad_skipped', st.session_state.language).format(**vad_stats))
+            st.write(transcription)
+
+def decoding_language() -> Optional[str]:
+    # None lets the job detect the spoken language; the UI language is only for the interface.
+    choice = st.session_state.get('decode_language', AUTO)
+    return None if choice == AUTO else choice
+
+def transcript_cache_key(audio_sha256: str, language: Optional[str], model_name: str) -> str:
+    # The policy's decoding options change with the queue, so they are left
+    # out; a result from the same model is reused whichever it ran with.
+    return make_key(audio_sha256, model_name, language, DECODE_OPTIONS)
+
+def lookup_transcript(job_queue: JobQueue, audio_sha256: str,
+                      decision: Decision) -> Tuple[str, str, Optional[Dict], bool]:
+    # The chosen model depends on the queue, so a job or cached result from
+    # that model or a larger one is as good as a hit. Returns the model and
+    # key to submit under, the cached result, and whether the audio is known.
+    keys = {
+        transcript_cache_key(audio_sha256, decoding_language(), model_name): model_name
+        for model_name in models_at_least(decision.model_name)
+    }
+    existing = job_queue.find(list(keys))
+    if existing is not None:
+        return keys[existing], existing, None, True
+    cache = get_cache()
+    for key, model_name in keys.items():
+        cached = cache.get(key)
+        if cached is not None:
+            return model_name, key, cached, True
+    key = transcript_cache_key(audio_sha256, decoding_language(), decision.model_name)
+    return decision.model_name, key, None, False
+
+def submit_transcription(data: bytes, name: str) -> str:
+    job_queue = get_queue()
+    with stage("policy"):
+        decision = decide(data, job_queue.pending_count(), JOB_WORKERS)
+    with stage("hash"):
+        model_name, key, cached, _ = lookup_transcript(job_queue, audio_hash(data), decision)
+    options = {'model': model_name, **decision.options}
+    return job_queue.submit(data, name, key, decoding_language(), cached, options, decision.duration)
+
+def submit_upload(uploaded_file) -> str:
+    job_queue = get_queue()
+    ingested = ingest(uploaded_file, uploaded_file.name, job_queue.spool_dir)
+    with stage("policy"):
+        decision = decide(ingested.path, job_queue.pending_count(), JOB_WORKERS)
+    model_name, key, cached, known = lookup_transcript(job_queue, ingested.sha256, decision)
+    if not known:
+        ingested = convert_for_spool(ingested)
+    options = {'model': model_name, **decision.options}
+    return job_queue.submit_path(
+        ingested.path, uploaded_file.name, key, decoding_language(), cached, options, decision.duration
+    )
+
+def process_files(files) -> Dict[str, str]:
+    job_ids = {}
     for uploaded_file in files:
-        col1, col2 = st.columns([4, 1])
-        with col1:
-            st.write(f"{uploaded_file.name}")
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_file_path = tmp_file.name
-        
+        used = get_queue().spooled_bytes(list(st.session_state.session_jobs))
+        if used + uploaded_file.size > SESSION_SPOOL_MB * 1024 * 1024:
+            st.warning(get_text('session_spool_exceeded', st.session_state.language).format(
+                name=uploaded_file.name, used=used // (1024 * 1024), limit=SESSION_SPOOL_MB
+            ))
+            continue
         try:
-            transcription = transcriber.transcribe_file(tmp_file_path, st.session_state.language)
-            if transcription:
-                transcriptions[uploaded_file.name] = transcription
-                with col2:
-                    st.download_button(
-                        "Download",
-                        transcription,
-                        f"{Path(uploaded_file.name).stem}_transcription.txt",
-                        "text/plain",
-                        key=f"download_{uploaded_file.name}"
-                    )
-                
-                with st.expander(f"Show transcription for {uploaded_file.name}"):
-                    st.write(transcription)
-        
+            with trace("upload", name=uploaded_file.name, bytes=uploaded_file.size):
+                job_ids[uploaded_file.name] = submit_upload(uploaded_file)
+            st.session_state.session_jobs.add(job_ids[uploaded_file.name])
         except Exception as e:
-            st.error(f"{get_text('processing_error', st.session_state.language)} {uploaded_file.name}: {str(e)}")
+            # One file's failure (a bad decode, a full disk, a locked queue)
+            # must not lose the ids of the files already submitted.
+            st.error(f"{get_text('processing_error', st.session_state.language)} {uploaded_file.name}: {e}")
+    return job_ids
+
+def render_jobs(job_ids: Dict[str, str]) -> Tuple[Dict[str, str], bool]:
+    jobs = get_queue().get(list(job_ids.values()))
+    transcriptions = {}
+    pending = False
+    
+    for name, job_id in job_ids.items():
+        job = jobs.get(job_id)
+        if job is None:
+            continue
         
-        finally:
-            try:
-                os.unlink(tmp_file_path)
-            except:
-                pass
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.write(f"{name}")
+        
+        if job['status'] == DONE:
+            result = job['result']
+            languages = decode_languages()
+            if job['language'] is None and result.get('language') in languages:
+                col1.caption(get_text('detected_language', st.session_state.language).format(
+                    language=languages[result['language']]
+                ))
+            if result['text']:
+                transcriptions[name] = result['text']
+                render_file_result(name, result['text'], col2, st.container(), result.get('vad'))
+        elif job['status'] == FAILED:
+            st.error(f"{get_text('processing_error', st.session_state.language)} {name}: {job['error']}")
+        else:
+            pending = True
+            if job['status'] == QUEUED:
+                st.progress(0.0, text=get_text('job_queued', st.session_state.language))
+            else:
+                st.progress(job['progress'], text=get_text('job_running', st.session_state.language).format(progress=job['progress']))
+                if job['partial']:
+                    st.caption(f"…{job['partial'][-500:]}")
     
-    return transcriptions
+    return transcriptions, pending
 
-def save_audio_file(audio_data):
-    if not audio_data or 'bytes' not in audio_data:
-        return None
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-        tmp_file.write(audio_data['bytes'])
-        return tmp_file.name
+def restore_upload_jobs() -> Dict[str, str]:
+    job_ids = [job_id for job_id in st.query_params.get("jobs", "").split(",") if job_id]
+    jobs = get_queue().get(job_ids)
+    return {jobs[job_id]['name']: job_id for job_id in job_ids if job_id in jobs}
 
-def transcribe_audio(audio_data):
+def submit_recording(audio_data) -> Optional[str]:
     if not audio_data or 'bytes' not in audio_data:
         return None
-        
-    audio_path = save_audio_file(audio_data)
     
-    if not audio_path:
-        return None
-        
     try:
-        transcriber = AudioTranscriber()
-        transcription = transcriber.transcribe_file(audio_path, st.session_state.language)
-        return transcription
+        with trace("recording", bytes=len(audio_data['bytes'])):
+            return submit_transcription(audio_data['bytes'], f"{recording_source()}.wav")
     except Exception as e:
         st.error(f"{get_text('transcription_error', st.session_state.language)} {str(e)}")
         return None
-    finally:
+
+def render_debug_panel():
+    with st.expander(get_text('debug_panel', st.session_state.language), expanded=True):
+        st.write(get_text('recent_requests', st.session_state.language))
+        st.dataframe([
+            {**{k: v for k, v in data.items() if k != 'stages'}, **{f"{name}_s": s for name, s in data['stages'].items()}}
+            for data in recent_traces()
+        ])
+        st.write(get_text('memory_footprint', st.session_state.language))
+        session_memory = get_session_memory()
+        st.json({
+            'session': session_memory.footprint(st.session_state.session_id),
+            'total': session_memory.totals(),
+        })
+        st.code(render_prometheus(), language="text")
+
+def recording_source() -> str:
+    return f"Recording {datetime.datetime.now().strftime('%H:%M:%S')}"
+
+def append_to_transcript(words: List[Word], new_paragraph: bool = True):
+    if words:
+        segment = words_to_segment(words)
+        st.session_state.live_segments.append(segment)
+        st.session_state.transcript.append(
+            [segment], "Live", new_paragraph=new_paragraph, offset=st.session_state.live_offset
+        )
+
+def index_live_stream(streamer: StreamingTranscriber):
+    # Indexed once the stream stops, under a key of its own, like a recording's job.
+    if st.session_state.live_segments:
+        key = f"live:{st.session_state.session_id}:{st.session_state.live_id}"
+        result = {'segments': st.session_state.live_segments, 'language': streamer.language}
+        index_result({'dedup_key': key, 'name': st.session_state.live_source, 'duration': None}, result,
+                     streamer.transcriber.model_name)
+
+def render_transcript(store: TranscriptStore):
+    # Only one page of segments is rendered per rerun, so the cost stays flat
+    # however long the session gets; new segments land on the last page.
+    pages = store.page_count()
+    page = pages - 1
+    if pages > 1:
+        page = st.number_input(
+            get_text('transcript_page', st.session_state.language),
+            min_value=1, max_value=pages, value=pages, key=f"transcript_page_{store.version}"
+        ) - 1
+    with st.container(height=300):
+        for segment in store.page(page):
+            st.markdown(f"`{format_timestamp(segment['start'])[:8]}` {segment['text']}")
+
+def render_search():
+    index = get_search_index()
+    if not index.enabled:
+        st.warning(get_text('search_unavailable', st.session_state.language))
+        return
+    
+    query = st.text_input(get_text('search_query', st.session_state.language), key="search_query")
+    st.caption(get_text('search_index_stats', st.session_state.language).format(**index.stats()))
+    if not query.strip():
+        return
+    
+    started = time.perf_counter()
+    hits = index.search(query)
+    st.caption(get_text('search_results', st.session_state.language).format(
+        count=len(hits), ms=(time.perf_counter() - started) * 1000
+    ))
+    if not hits:
+        st.info(get_text('search_no_results', st.session_state.language))
+    for hit in hits:
+        details = [datetime.datetime.fromtimestamp(hit.created_at).strftime('%Y-%m-%d %H:%M'), hit.language, hit.model]
+        st.markdown(f"**{hit.source}** `{format_timestamp(hit.start)[:8]}` {hit.snippet}")
+        st.caption(" · ".join(detail for detail in details if detail))
+
+def frames_to_samples(frames, resampler) -> np.ndarray:
+    chunks = []
+    for frame in frames:
+        for resampled in resampler.resample(frame):
+            chunks.append(resampled.to_ndarray().reshape(-1))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32) / 32768.0
+
+def render_live_transcription():
+    st.write(get_text('live_instructions', st.session_state.language))
+    
+    ctx = webrtc_streamer(
+        key="live_recorder",
+        mode=WebRtcMode.SENDONLY,
+        audio_receiver_size=1024,
+        media_stream_constraints={"audio": True, "video": False}
+    )
+    
+    streamer = st.session_state.live_streamer
+    if not ctx.state.playing:
+        # The stop click reruns the script, so the tail left in the buffer of
+        # the previous stream is flushed here.
+        if streamer is not None:
+            first_text = not streamer.committed_text
+            with st.spinner(get_text('processing', st.session_state.language)):
+                append_to_transcript(streamer.finish(), new_paragraph=first_text)
+            index_live_stream(streamer)
+            st.session_state.live_streamer = None
+        return
+    
+    if streamer is None:
+        streamer = StreamingTranscriber(AudioTranscriber(), decoding_language())
+        st.session_state.live_streamer = streamer
+        st.session_state.live_offset = st.session_state.transcript.offset
+        st.session_state.live_id = uuid.uuid4().hex
+        st.session_state.live_source = f"Live {datetime.datetime.now().strftime('%H:%M:%S')}"
+        st.session_state.live_segments = []
+        st.session_state.live_resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    
+    live_placeholder = st.empty()
+    while ctx.state.playing and ctx.audio_receiver:
         try:
-            os.unlink(audio_path)
-        except:
-            pass
+            frames = ctx.audio_receiver.get_frames(timeout=1)
+        except queue.Empty:
+            continue
+        
+        first_text = not streamer.committed_text
+        append_to_transcript(
+            streamer.feed(frames_to_samples(frames, st.session_state.live_resampler)), new_paragraph=first_text
+        )
+        live_placeholder.markdown(f"{streamer.committed_text} *{streamer.pending_text}*")
 
 def initialize_session_state():
     if 'language' not in st.session_state:
         st.session_state.language = 'en'
-    if 'audio_data' not in st.session_state:
-        st.session_state.audio_data = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if 'recording_id' not in st.session_state:
+        # The recording itself is held by the session memory manager, which
+        # compresses it to disk once transcribed and evicts it with the session.
+        st.session_state.recording_id = None
     if 'last_audio_id' not in st.session_state:
         st.session_state.last_audio_id = None
-    if 'combined_transcript' not in st.session_state:
-        st.session_state.combined_transcript = ""
-    if 'transcribing' not in st.session_state:
-        st.session_state.transcribing = False
+    if 'transcript' not in st.session_state:
+        st.session_state.transcript = TranscriptStore()
+    if 'discord_sends' not in st.session_state:
+        st.session_state.discord_sends = {}
+    if 'recording_job' not in st.session_state:
+        st.session_state.recording_job = None
+    if 'upload_jobs' not in st.session_state:
+        # Job ids live in the URL so a browser refresh picks the jobs back up.
+        st.session_state.upload_jobs = restore_upload_jobs()
+    if 'session_jobs' not in st.session_state:
+        # Every upload job of this session, for the limit on spooled audio.
+        st.session_state.session_jobs = set(st.session_state.upload_jobs.values())
+    if 'live_streamer' not in st.session_state:
+        st.session_state.live_streamer = None
 
 def main():
+    start_warmup()
     initialize_session_state()
+    start_http_server()
+    get_session_memory().touch(st.session_state.session_id, transcript=st.session_state.transcript.nbytes())
     
     st.title(get_text('title', st.session_state.language))
     st.write(get_text('author', st.session_state.language))
@@ -401,11 +710,32 @@ def main():
         st.session_state.language = language
         st.rerun()
     
+    decode_language_options = decode_languages()
+    st.selectbox(
+        get_text('decode_language_selector', st.session_state.language),
+        options=list(decode_language_options.keys()),
+        format_func=lambda code: decode_language_options[code] or get_text('auto_detect', st.session_state.language),
+        key="decode_language"
+    )
+    
+    warm_state = readiness()
+    if warm_state['status'] == MODEL_FAILED:
+        st.error(get_text('model_load_failed', st.session_state.language).format(error=warm_state['error']))
+    elif warm_state['status'] != MODEL_READY:
+        st.info(get_text('model_loading', st.session_state.language).format(seconds=warm_state.get('elapsed_seconds', 0)))
+    
     st.write("---")
     
     st.write(get_text('description', st.session_state.language))
     
-    tab1, tab2 = st.tabs([get_text('record_audio', st.session_state.language), get_text('upload_files', st.session_state.language)])
+    # Rerun until the model is ready so the banner clears on its own.
+    poll_jobs = warm_state['status'] not in (MODEL_READY, MODEL_FAILED)
+    
+    tab1, tab2, tab3 = st.tabs([
+        get_text('record_audio', st.session_state.language),
+        get_text('upload_files', st.session_state.language),
+        get_text('search_tab', st.session_state.language)
+    ])
     
     with tab1:
         st.subheader(get_text('record_audio', st.session_state.language))
@@ -414,76 +744,90 @@ def main():
         
         status_container = st.empty()
         
-        audio_data = mic_recorder(
-            start_prompt=get_text('start_recording', st.session_state.language),
-            stop_prompt=get_text('stop_recording', st.session_state.language),
-            just_once=False,
-            use_container_width=True,
-            key="recorder"
-        )
+        live_mode = webrtc_streamer is not None and st.checkbox(get_text('live_mode', st.session_state.language), key="live_mode")
+        
+        if live_mode:
+            render_live_transcription()
+            audio_data = None
+        else:
+            audio_data = mic_recorder(
+                start_prompt=get_text('start_recording', st.session_state.language),
+                stop_prompt=get_text('stop_recording', st.session_state.language),
+                just_once=False,
+                use_container_width=True,
+                key="recorder"
+            )
+        
+        session_memory = get_session_memory()
+        session_id = st.session_state.session_id
         
         if audio_data and 'id' in audio_data and audio_data['id'] != st.session_state.last_audio_id:
             st.session_state.last_audio_id = audio_data['id']
-            st.session_state.audio_data = audio_data
-            st.session_state.transcribing = True
+            st.session_state.recording_id = session_memory.add_recording(session_id, audio_data['bytes'])
+            st.session_state.recording_job = submit_recording(audio_data)
             st.rerun()
         
-        if st.session_state.transcribing and st.session_state.audio_data:
-            with status_container:
-                st.info(get_text('transcribing', st.session_state.language))
-            
-            st.audio(st.session_state.audio_data['bytes'], format="audio/wav")
+        if st.session_state.recording_id:
+            playback = session_memory.recording(session_id, st.session_state.recording_id)
+            if playback is not None:
+                st.audio(playback[0], format=playback[1])
+        
+        if st.session_state.recording_job:
+            job = get_queue().get([st.session_state.recording_job]).get(st.session_state.recording_job)
             
-            with st.spinner(get_text('processing', st.session_state.language)):
-                transcription = transcribe_audio(st.session_state.audio_data)
-                
-                if transcription:
-                    if st.session_state.combined_transcript:
-                        st.session_state.combined_transcript += f"\n\n{transcription.strip()}"
-                    else:
-                        st.session_state.combined_transcript = transcription.strip()
-                    
+            if job is not None and job['status'] in (QUEUED, RUNNING):
+                poll_jobs = True
+                with status_container:
+                    st.info(get_text('transcribing', st.session_state.language))
+            else:
+                if st.session_state.recording_id:
+                    session_memory.spill(session_id, st.session_state.recording_id)
+                if job is not None and job['status'] == DONE and job['result']['text']:
+                    result = job['result']
+                    st.session_state.transcript.append(
+                        result['segments'], recording_source(), job['duration'] or result.get('vad', {}).get('total_seconds', 0.0)
+                    )
                     with status_container:
                         st.success(get_text('transcription_complete', st.session_state.language))
                 else:
                     with status_container:
                         st.error(get_text('transcription_failed', st.session_state.language))
-            
-            st.session_state.transcribing = False
+                st.session_state.recording_job = None
         
-        if st.session_state.combined_transcript:
+        transcript = st.session_state.transcript
+        if len(transcript):
             st.subheader(get_text('transcript', st.session_state.language))
             
-            st.text_area(
-                get_text('accumulated_transcriptions', st.session_state.language),
-                st.session_state.combined_transcript,
-                height=300
-            )
+            st.caption(get_text('accumulated_transcriptions', st.session_state.language))
+            render_transcript(transcript)
             
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
+                export_format = st.selectbox(
+                    get_text('export_format', st.session_state.language),
+                    options=list(EXPORT_FORMATS.keys()),
+                    format_func=str.upper,
+                    key="export_format"
+                )
+                # Built once per format and transcript version, not on every rerun.
+                file_name, mime = EXPORT_FORMATS[export_format]
                 st.download_button(
                     get_text('download_transcript', st.session_state.language),
-                    st.session_state.combined_transcript,
-                    "transcript.txt",
-                    "text/plain"
+                    transcript.export(export_format),
+                    file_name,
+                    mime
                 )
             
             with col2:
-                copy_to_clipboard_component(st.session_state.combined_transcript, get_text('copy_to_clipboard', st.session_state.language))
+                copy_button(transcript.text, "copy_transcript", transcript.version)
             
             with col3:
-                if st.button(get_text('send_to_discord', st.session_state.language), key="discord_recording"):
-                    with st.spinner(get_text('sending_to_discord', st.session_state.language)):
-                        if send_to_discord(st.session_state.combined_transcript, "Microphone Recording"):
-                            st.success(get_text('sent_to_discord', st.session_state.language))
-                        else:
-                            st.error(get_text('failed_to_send', st.session_state.language))
+                poll_jobs = discord_button(transcript.text(), "Microphone Recording", "discord_recording") or poll_jobs
             
             with col4:
                 if st.button(get_text('clear_transcript', st.session_state.language)):
-                    st.session_state.combined_transcript = ""
+                    transcript.clear()
                     st.rerun()
                 
         with st.expander(get_text('trouble_recording', st.session_state.language)):
@@ -501,32 +845,41 @@ def main():
             start_button = col1.button(get_text('start_transcription', st.session_state.language), key="file_transcribe", type="primary")
             
             if start_button:
-                transcriber = AudioTranscriber()
-                transcriptions = process_files(transcriber, uploaded_files)
+                st.session_state.upload_jobs = process_files(uploaded_files)
+                st.query_params["jobs"] = ",".join(st.session_state.upload_jobs.values())
+        
+        if st.session_state.upload_jobs:
+            transcriptions, pending = render_jobs(st.session_state.upload_jobs)
+            poll_jobs = poll_jobs or pending
+            
+            if transcriptions and not pending:
+                combined_text = "\n\n".join(f"{text}" for fname, text in transcriptions.items())
+                
+                col1, col2, col3 = st.columns(3)
+                
+                with col1:
+                    st.download_button(
+                        get_text('download_all', st.session_state.language),
+                        combined_text,
+                        "combined_transcriptions.txt",
+                        "text/plain"
+                    )
                 
-                if transcriptions:
-                    combined_text = "\n\n".join(f"{text}" for fname, text in transcriptions.items())
-                    
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.download_button(
-                            get_text('download_all', st.session_state.language),
-                            combined_text,
-                            "combined_transcriptions.txt",
-                            "text/plain"
-                        )
-                    
-                    with col2:
-                        copy_to_clipboard_component(combined_text, get_text('copy_to_clipboard', st.session_state.language))
-                    
-                    with col3:
-                        if st.button(get_text('send_to_discord', st.session_state.language), key="discord_files"):
-                            with st.spinner(get_text('sending_to_discord', st.session_state.language)):
-                                if send_to_discord(combined_text, "File Upload"):
-                                    st.success(get_text('sent_to_discord', st.session_state.language))
-                                else:
-                                    st.error(get_text('failed_to_send', st.session_state.language))
+                with col2:
+                    copy_button(lambda: combined_text, "copy_uploads", tuple(st.session_state.upload_jobs.values()))
+                
+                with col3:
+                    poll_jobs = discord_button(combined_text, "File Upload", "discord_files") or poll_jobs
+    
+    with tab3:
+        render_search()
+    
+    if st.query_params.get("debug") == "1" or st.sidebar.checkbox(get_text('debug_panel', st.session_state.language)):
+        render_debug_panel()
+    
+    if poll_jobs:
+        time.sleep(JOB_POLL_SECONDS * 2)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
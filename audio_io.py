@@ -0,0 +1,133 @@
+import os
+import struct
+import subprocess
+import wave
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from metrics import stage
+
+SAMPLE_RATE = 16000
+
+
+class AudioDecodeError(RuntimeError):
+    pass
+
+
+def _decode_wav(source) -> Optional[np.ndarray]:
+    try:
+        with wave.open(source) as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+    # Other rates need a proper anti-aliasing resampler, which is ffmpeg's job.
+    if sample_width != 2 or rate != SAMPLE_RATE:
+        return None
+
+    audio = _pcm_to_float(frames)
+    if channels > 1:
+        audio = audio[:len(audio) - len(audio) % channels].reshape(-1, channels).mean(axis=1)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def _ffmpeg_command(source: str):
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-threads", "0",
+        "-i", source,
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(SAMPLE_RATE),
+        "-"
+    ]
+
+
+def _pcm_to_float(pcm) -> np.ndarray:
+    # One float32 copy, scaled in place; a second array would double the peak.
+    audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    audio *= 1 / 32768
+    return audio
+
+
+def ffmpeg_decode_file(path: str) -> np.ndarray:
+    try:
+        with stage("decode"):
+            out = subprocess.run(_ffmpeg_command(path), capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"Failed to decode audio: {e.stderr.decode(errors='replace').strip()}") from e
+    return _pcm_to_float(out)
+
+
+def decode_file(path: str) -> np.ndarray:
+    with open(path, "rb") as f:
+        header = f.read(4)
+    if header == b"RIFF":
+        # Read straight from the file, so the WAV is never held as bytes too.
+        with stage("decode"):
+            audio = _decode_wav(path)
+        if audio is not None:
+            return audio
+    return ffmpeg_decode_file(path)
+
+
+def _pcm_layout(path: str) -> Optional[Tuple[int, int]]:
+    # (data offset, frames) of a 16 kHz mono 16-bit PCM WAV, the format the
+    # spool holds; None for anything else.
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"fmt " and size >= 16:
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(size - 16 + size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None or (fmt[0], fmt[1], fmt[2], fmt[5]) != (1, 1, SAMPLE_RATE, 16):
+                    return None
+                offset = f.tell()
+                # A WAV written to a pipe has no real size in its header.
+                size = min(size, os.fstat(f.fileno()).st_size - offset)
+                return offset, size // 2
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)
+
+
+class PcmFile:
+    # A spooled WAV read one range at a time, so a long recording never has
+    # to be held in memory whole. Slicing returns float32 samples.
+    def __init__(self, path: str, offset: int, frames: int):
+        self.path = path
+        self.offset = offset
+        self.frames = frames
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def __getitem__(self, index: slice) -> np.ndarray:
+        start, stop, step = index.indices(self.frames)
+        if step != 1:
+            raise ValueError("PcmFile only supports contiguous slices")
+        with open(self.path, "rb") as f:
+            f.seek(self.offset + 2 * start)
+            return _pcm_to_float(np.fromfile(f, dtype="<i2", count=max(0, stop - start)))
+
+
+def open_pcm(path: str) -> Optional[PcmFile]:
+    layout = _pcm_layout(path)
+    return PcmFile(path, *layout) if layout is not None else None
+
+
+def load_audio(path: str) -> Union[np.ndarray, PcmFile]:
+    pcm = open_pcm(path)
+    return pcm if pcm is not None else decode_file(path)
@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from pathlib import Path
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+from audio_io import decode_file
+from model_registry import PRECISIONS, configure_cpu_threads
+from transcriber import DECODE_OPTIONS, MODEL_NAME, SUPPORTED_FORMATS, AudioTranscriber
+from transcript_cache import file_hash, get_cache, make_key
+from worker_pool import TranscriptionPool, merge_worker_trace
+
+logger = logging.getLogger("batch_transcribe")
+
+OUTPUT_FORMATS = ['txt', 'json']
+
+
+def discover(inputs: List[str]) -> Iterator[Path]:
+    for item in inputs:
+        path = Path(item)
+        if path.is_file():
+            if path.suffix.lower() in SUPPORTED_FORMATS:
+                yield path.resolve()
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if Path(name).suffix.lower() in SUPPORTED_FORMATS:
+                    yield Path(root, name).resolve()
+
+
+class Manifest:
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write can leave a truncated last line.
+                        continue
+                    self.entries[entry['path']] = entry
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def fingerprint(path: Path) -> Dict[str, Any]:
+        stat = path.stat()
+        return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+    def is_done(self, path: Path) -> bool:
+        entry = self.entries.get(str(path))
+        return bool(entry) and entry['status'] == "done" and all(
+            entry.get(k) == v for k, v in self.fingerprint(path).items()
+        )
+
+    def record(self, path: Path, status: str, **fields):
+        entry = {'path': str(path), 'status': status, 'finished_at': time.time(), **self.fingerprint(path), **fields}
+        self.entries[entry['path']] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def output_base(path: Path, inputs: List[Path], output_dir: Path) -> Path:
+    # The source extension is kept (talk.mp3.txt) so talk.mp3 and talk.mp4 in
+    # one directory do not overwrite each other.
+    for root in inputs:
+        if root.is_dir() and root in path.parents:
+            return output_dir / path.relative_to(root)
+    return output_dir / path.name
+
+
+def output_bases(files: List[Path], inputs: List[Path], output_dir: Path) -> Dict[Path, Path]:
+    # Files passed directly from different directories can still share a name;
+    # those get a short hash of their full path. Computed over every input,
+    # not just the remaining ones, so a resumed run picks the same names.
+    bases = {path: output_base(path, inputs, output_dir) for path in files}
+    counts = Counter(bases.values())
+    for path, base in bases.items():
+        if counts[base] > 1:
+            digest = hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:8]
+            bases[path] = base.with_name(f"{base.name}.{digest}")
+    return bases
+
+
+def write_outputs(base: Path, source: Path, result: Dict[str, Any], model_name: str, formats: List[str]) -> List[str]:
+    base.parent.mkdir(parents=True, exist_ok=True)
+    written = []
+    if 'txt' in formats:
+        target = base.with_name(base.name + ".txt")
+        target.write_text(result['text'].strip() + "\n", encoding="utf-8")
+        written.append(str(target))
+    if 'json' in formats:
+        target = base.with_name(base.name + ".json")
+        payload = {'source': str(source), 'model': model_name, **result}
+        target.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        written.append(str(target))
+    return written
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Transcribe audio files and directory trees without the Streamlit UI.")
+    parser.add_argument("inputs", nargs="+", help="audio files or directories to scan recursively")
+    parser.add_argument("-o", "--output-dir", default="transcripts", help="where transcripts are written")
+    parser.add_argument("-m", "--model", default=MODEL_NAME, help="Whisper model name")
+    parser.add_argument("--precision", choices=PRECISIONS, default=None,
+                        help="weights precision (default: fp16 on CUDA, fp32 on CPU); int8 quantizes for CPU")
+    parser.add_argument("-l", "--language", default=None, help="spoken language code; detected when omitted")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="worker processes, each with its own model")
+    parser.add_argument("--torch-threads", type=int, default=0, help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--formats", default="txt,json", help=f"comma-separated output formats: {', '.join(OUTPUT_FORMATS)}")
+    parser.add_argument("--manifest", default=None, help="manifest path (default: <output-dir>/manifest.jsonl)")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the shared transcript cache")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    logger.setLevel(logging.INFO)
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if unknown:
+        print(f"Unknown output format(s): {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    output_dir = Path(args.output_dir).resolve()
+    roots = [Path(item).resolve() for item in args.inputs]
+    manifest = Manifest(Path(args.manifest) if args.manifest else output_dir / "manifest.jsonl")
+    cache = None if args.no_cache else get_cache()
+
+    files = list(dict.fromkeys(discover(args.inputs)))
+    bases = output_bases(files, roots, output_dir)
+    todo = [path for path in files if not manifest.is_done(path)]
+    logger.info("%d files found, %d already done, %d to transcribe", len(files), len(files) - len(todo), len(todo))
+
+    failures = 0
+
+    def finish(path: Path, key: str, result: Optional[Dict[str, Any]], error: Optional[str]):
+        nonlocal failures
+        if error is not None:
+            failures += 1
+            logger.error("%s: %s", path, error)
+            manifest.record(path, "failed", error=error)
+            return
+        if cache is not None:
+            cache.put(key, result)
+        outputs = write_outputs(bases[path], path, result, args.model, formats)
+        manifest.record(path, "done", outputs=outputs, language=result.get('language'))
+        logger.info("%s: done", path)
+
+    decode_options = {**DECODE_OPTIONS, 'precision': args.precision} if args.precision else DECODE_OPTIONS
+    pending = []
+    for path in todo:
+        key = make_key(file_hash(str(path)), args.model, args.language, decode_options)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            finish(path, key, cached, None)
+        else:
+            pending.append((path, key))
+
+    try:
+        if args.workers > 1 and len(pending) > 1:
+            pool = TranscriptionPool(args.workers, args.torch_threads, args.model, precision=args.precision)
+            in_flight = {}
+            queue = list(reversed(pending))
+            # Keep only a couple of files per worker queued so a killed run has
+            # little in flight and memory stays bounded on huge trees.
+            while queue or in_flight:
+                while queue and len(in_flight) < args.workers * 2:
+                    path, key = queue.pop()
+                    in_flight[pool.submit_file(str(path), args.language, key)] = (path, key)
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    path, key = in_flight.pop(future)
+                    try:
+                        finish(path, key, merge_worker_trace(future.result()), None)
+                    except Exception as e:
+                        finish(path, key, None, str(e))
+            pool.shutdown()
+        elif pending:
+            configure_cpu_threads(args.torch_threads)
+            transcriber = AudioTranscriber(args.model, precision=args.precision)
+            for path, key in pending:
+                try:
+                    audio = decode_file(str(path))
+                    result = transcriber.transcribe_resumable(audio, args.language, checkpoint_key=key)
+                    finish(path, key, result, None)
+                except Exception as e:
+                    finish(path, key, None, str(e))
+    finally:
+        manifest.close()
+
+    logger.info("%d transcribed, %d failed", len(pending) - failures, failures)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
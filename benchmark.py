@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, decode_file
+from discord_delivery import DISCORD_MESSAGE_LIMIT, chunk_message
+from long_form import plan_chunks, stitch
+from transcriber import SUPPORTED_FORMATS, AudioTranscriber
+from vad import trim_silence
+
+DEFAULT_DURATIONS = [5, 30, 120, 600]
+DEFAULT_MODELS = ['tiny', 'base']
+DEFAULT_THREADS = [1, os.cpu_count() or 1]
+DEFAULT_PRECISIONS = ['fp32']
+STUB_WORDS_PER_SECOND = 2.5
+
+ENCODERS = {
+    '.mp3': ["-c:a", "libmp3lame", "-b:a", "64k"],
+    '.m4a': ["-c:a", "aac", "-b:a", "64k"],
+    '.mp4': ["-c:a", "aac", "-b:a", "64k", "-f", "mp4"],
+    '.ogg': ["-c:a", "libvorbis", "-q:a", "3"],
+    '.wav': ["-c:a", "pcm_s16le"],
+    '.mov': ["-c:a", "aac", "-b:a", "64k", "-f", "mov"],
+    '.mkv': ["-c:a", "aac", "-b:a", "64k", "-f", "matroska"],
+    '.webm': ["-c:a", "libopus", "-b:a", "48k", "-f", "webm"],
+}
+
+
+def synth_speech(seconds: float, seed: int = 0) -> np.ndarray:
+    # Voiced "syllables" (harmonic stack with a wandering pitch, 4 Hz envelope)
+    # separated by pauses, over a low noise floor, so VAD and chunking see
+    # realistic structure without bundling real recordings.
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    talking = (np.sin(2 * np.pi * t / 7.0) > -0.4).astype(np.float32)
+    audio = 0.2 * voiced * envelope * talking + rng.normal(0, 0.002, n)
+    return audio.astype(np.float32)
+
+
+def write_wav(path: str, audio: np.ndarray):
+    import wave
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+
+
+def build_corpus(directory: str, durations: List[float], formats: List[str]) -> Dict[str, Dict[float, str]]:
+    corpus: Dict[str, Dict[float, str]] = {fmt: {} for fmt in formats}
+    for duration in durations:
+        source = os.path.join(directory, f"synth_{duration:g}s.wav")
+        write_wav(source, synth_speech(duration))
+        for fmt in formats:
+            target = os.path.join(directory, f"synth_{duration:g}s{fmt}")
+            if fmt == '.wav':
+                corpus[fmt][duration] = source
+                continue
+            subprocess.run(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", source, *ENCODERS[fmt], target],
+                check=True
+            )
+            corpus[fmt][duration] = target
+    return corpus
+
+
+class StubModel:
+    def transcribe(self, audio, **options) -> Dict[str, Any]:
+        seconds = len(audio) / SAMPLE_RATE
+        segments = []
+        for start in np.arange(0, seconds, 5.0):
+            end = min(seconds, start + 5.0)
+            words = " ".join("lorem" for _ in range(max(1, int((end - start) * STUB_WORDS_PER_SECOND))))
+            segments.append({'start': float(start), 'end': float(end), 'text': f" {words}."})
+        return {'text': "".join(seg['text'] for seg in segments), 'segments': segments, 'language': options.get('language')}
+
+
+def _proc_status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> float:
+    # ru_maxrss only ever grows, so every case would report the peak left by
+    # building the corpus. On Linux writing 5 to clear_refs resets VmHWM to
+    # the current RSS; elsewhere the case's delta over the prior peak is all
+    # that can be measured.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(usage / 1024 if sys.platform != "darwin" else usage / (1024 * 1024), 1)
+
+
+def timed(fn: Callable[[], Any]):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def run_case(transcriber: AudioTranscriber, path: str, duration: float) -> Dict[str, Any]:
+    rss_start = reset_peak_rss()
+    audio, decode_s = timed(lambda: decode_file(path))
+    (speech, _), vad_s = timed(lambda: trim_silence(audio))
+    result, inference_s = timed(lambda: transcriber.transcribe(audio, "en"))
+    plans, plan_s = timed(lambda: plan_chunks(audio))
+    _, stitch_s = timed(lambda: stitch(plans, {i: result for i in range(len(plans))}))
+    _, discord_s = timed(lambda: chunk_message(result['text'], DISCORD_MESSAGE_LIMIT))
+    total = decode_s + inference_s
+    return {
+        'duration_s': duration,
+        'bytes': os.path.getsize(path),
+        'decode_s': round(decode_s, 4),
+        'vad_s': round(vad_s, 4),
+        'speech_ratio': round(len(speech) / max(1, len(audio)), 3),
+        'inference_s': round(inference_s, 4),
+        'chunk_plan_s': round(plan_s, 4),
+        'stitch_s': round(stitch_s, 4),
+        'discord_chunk_s': round(discord_s, 4),
+        'rtf': round(inference_s / duration, 4),
+        'total_rtf': round(total / duration, 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_delta_mb': round(peak_rss_mb() - rss_start, 1),
+    }
+
+
+def load_transcriber(model_name: str, n_threads: int, precision: str):
+    from model_registry import ModelRegistry, configure_cpu_threads, model_nbytes
+    configure_cpu_threads(n_threads)
+    registry = ModelRegistry()
+    entry, load_s = timed(lambda: registry.get(model_name, "cpu", precision))
+    transcriber = AudioTranscriber.with_model(entry.model, model_name, *entry.key[1:])
+    return transcriber, load_s, round(model_nbytes(entry.model) / (1024 * 1024), 1)
+
+
+def run(models: List[str], threads: List[int], durations: List[float], formats: List[str], stub: bool,
+        precisions: List[str] = DEFAULT_PRECISIONS) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'stub': stub,
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = build_corpus(directory, durations, formats)
+        configs = [("stub", 1, "fp32")] if stub else [(m, t, p) for m in models for p in precisions for t in threads]
+        for model_name, n_threads, precision in configs:
+            if stub:
+                transcriber, load_s, model_mb = AudioTranscriber.with_model(StubModel(), "stub"), 0.0, 0.0
+            else:
+                transcriber, load_s, model_mb = load_transcriber(model_name, n_threads, precision)
+            for fmt in formats:
+                for duration in durations:
+                    case = run_case(transcriber, corpus[fmt][duration], duration)
+                    case.update({
+                        'model': model_name, 'threads': n_threads, 'precision': precision, 'format': fmt,
+                        'model_load_s': round(load_s, 3), 'model_mb': model_mb,
+                    })
+                    report['runs'].append(case)
+                    print(json.dumps(case), file=sys.stderr)
+    return report
+
+
+def normalize_words(text: str) -> List[str]:
+    return re.findall(r"[\w']+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    # Word-level Levenshtein distance, one row at a time.
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return round(previous[-1] / len(ref), 4)
+
+
+def compare_precisions(models: List[str], precisions: List[str], n_threads: int, clip: str,
+                       reference_text: Optional[str] = None) -> List[Dict[str, Any]]:
+    # Without a human reference transcript, the fp32 output of the same model
+    # is the reference, so WER measures how far quantization drifts from it.
+    audio = decode_file(clip)
+    duration = len(audio) / SAMPLE_RATE
+    rows = []
+    for model_name in models:
+        baseline = None
+        for precision in sorted(precisions, key=lambda p: p != "fp32"):
+            transcriber, load_s, model_mb = load_transcriber(model_name, n_threads, precision)
+            result, inference_s = timed(lambda: transcriber.transcribe(audio, "en"))
+            if baseline is None:
+                baseline = {'text': result['text'], 'inference_s': inference_s}
+            reference = reference_text if reference_text is not None else baseline['text']
+            row = {
+                'model': model_name,
+                'precision': precision,
+                'threads': n_threads,
+                'model_load_s': round(load_s, 3),
+                'model_mb': model_mb,
+                'inference_s': round(inference_s, 4),
+                'rtf': round(inference_s / duration, 4),
+                'speedup': round(baseline['inference_s'] / inference_s, 2),
+                'wer': word_error_rate(reference, result['text']),
+                'wer_reference': "text" if reference_text is not None else "fp32",
+            }
+            rows.append(row)
+            print(json.dumps(row), file=sys.stderr)
+    return rows
+
+
+REGRESSION_METRICS = ['decode_s', 'vad_s', 'inference_s', 'chunk_plan_s', 'stitch_s', 'discord_chunk_s']
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, floor_s: float = 0.005) -> List[str]:
+    def index(report):
+        return {(r['model'], r['threads'], r.get('precision', "fp32"), r['format'], r['duration_s']): r for r in report['runs']}
+
+    regressions = []
+    previous = index(baseline)
+    for case_key, case in index(current).items():
+        old = previous.get(case_key)
+        if old is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            # Ignore sub-floor timings; they are dominated by scheduler noise.
+            if case[metric] > floor_s and case[metric] > old[metric] * (1 + tolerance) + floor_s:
+                regressions.append(f"{case_key} {metric}: {old[metric]:.4f}s -> {case[metric]:.4f}s")
+    return regressions
+
+
+def parse_list(value: str, cast=str) -> List:
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline transcription benchmarks on synthetic audio.")
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS))
+    parser.add_argument("--threads", default=",".join(str(t) for t in DEFAULT_THREADS))
+    parser.add_argument("--durations", default=",".join(str(d) for d in DEFAULT_DURATIONS), help="seconds, comma-separated")
+    parser.add_argument("--formats", default=",".join(SUPPORTED_FORMATS))
+    parser.add_argument("--precisions", default=",".join(DEFAULT_PRECISIONS), help="comma-separated: fp32, int8")
+    parser.add_argument("--stub", action="store_true", help="replace Whisper with a stub to measure pipeline overhead only")
+    parser.add_argument("--reference", help="speech clip for the accuracy/speed comparison across --precisions")
+    parser.add_argument("--reference-text", help="human transcript of --reference (default: compare against fp32 output)")
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against a previous JSON report and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    report = run(
+        parse_list(args.models),
+        parse_list(args.threads, int),
+        parse_list(args.durations, float),
+        parse_list(args.formats),
+        args.stub,
+        parse_list(args.precisions)
+    )
+    if args.reference and not args.stub:
+        reference_text = None
+        if args.reference_text:
+            with open(args.reference_text, encoding="utf-8") as f:
+                reference_text = f.read()
+        report['accuracy'] = compare_precisions(
+            parse_list(args.models), parse_list(args.precisions), max(parse_list(args.threads, int)),
+            args.reference, reference_text
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import annotate, stage, trace
+
+DISCORD_MESSAGE_LIMIT = 1900
+DISCORD_MAX_RETRIES = 5
+DISCORD_TIMEOUT = 10
+DISCORD_MAX_BACKOFF = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(RuntimeError):
+    def __init__(self, message: str, sent: int = 0, total: int = 0):
+        super().__init__(message)
+        self.sent = sent
+        self.total = total
+
+
+def _split(text: str, pattern: str) -> List[str]:
+    return [piece for piece in re.split(pattern, text) if piece.strip()]
+
+
+def _pack(pieces: List[str], limit: int, joiner: str) -> List[str]:
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current}{joiner}{piece}" if current else piece
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_message(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    text = text.strip()
+    if len(text) <= limit:
+        return [text] if text else []
+
+    # Prefer paragraph breaks, then sentence ends, then spaces; only a single
+    # word longer than the limit is cut mid-word.
+    units: List[Tuple[str, str]] = []
+    for paragraph in _split(text, r"\n\s*\n"):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= limit:
+            units.append((paragraph, "\n\n"))
+            continue
+        sentences: List[str] = []
+        for sentence in _split(paragraph, r"(?<=[.!?。！？])\s+"):
+            sentence = sentence.strip()
+            if len(sentence) <= limit:
+                sentences.append(sentence)
+                continue
+            words: List[str] = []
+            for word in sentence.split():
+                words.extend(word[i:i + limit] for i in range(0, len(word), limit))
+            sentences.extend(_pack(words, limit, " "))
+        units.extend((chunk, "\n\n" if i == 0 else " ") for i, chunk in enumerate(_pack(sentences, limit, " ")))
+
+    chunks: List[str] = []
+    current = ""
+    for unit, joiner in units:
+        candidate = f"{current}{joiner}{unit}" if current else unit
+        if len(candidate) <= limit:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class DiscordDelivery:
+    def __init__(self, webhook_url: str, session: Optional[requests.Session] = None,
+                 max_retries: int = DISCORD_MAX_RETRIES, timeout: float = DISCORD_TIMEOUT):
+        self.webhook_url = webhook_url
+        self.max_retries = max_retries
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self._blocked_until = 0.0
+        # One transcript at a time per webhook so parts never interleave.
+        self._send_lock = threading.Lock()
+
+    def _wait_for_bucket(self):
+        delay = self._blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _update_bucket(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        if remaining is not None and reset_after is not None and int(float(remaining)) <= 0:
+            self._blocked_until = time.monotonic() + float(reset_after)
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        try:
+            return float(response.json().get("retry_after", 1.0))
+        except ValueError:
+            return float(response.headers.get("Retry-After", 1.0))
+
+    def _backoff(self, attempt: int) -> float:
+        return min(DISCORD_MAX_BACKOFF, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+
+    def post(self, content: str):
+        error = "no attempt made"
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_bucket()
+            try:
+                response = self.session.post(self.webhook_url, json={"content": content}, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = str(e)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self._update_bucket(response.headers)
+            if response.status_code in (200, 204):
+                return
+            if response.status_code == 429:
+                retry_after = self._retry_after(response)
+                logger.info("Discord rate limited, retrying in %.2fs", retry_after)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                error = "rate limited"
+                continue
+            if response.status_code >= 500:
+                error = f"HTTP {response.status_code}"
+                time.sleep(self._backoff(attempt))
+                continue
+            raise DeliveryError(f"HTTP {response.status_code}: {response.text[:200]}")
+        raise DeliveryError(f"giving up after {self.max_retries + 1} attempts: {error}")
+
+    def send(self, transcript: str, part_prefix: str = "Part") -> int:
+        with trace("discord", chars=len(transcript)):
+            with stage("discord_chunk"):
+                messages = self._messages(transcript, part_prefix)
+            annotate(messages=len(messages))
+            with self._send_lock:
+                for sent, message in enumerate(messages):
+                    try:
+                        with stage("discord_post"):
+                            self.post(message)
+                    except DeliveryError as e:
+                        raise DeliveryError(str(e), sent, len(messages)) from e
+        return len(messages)
+
+    def _messages(self, transcript: str, part_prefix: str) -> List[str]:
+        header_room = len(f"**{part_prefix} 9999/9999:**\n")
+        if len(transcript.strip()) <= DISCORD_MESSAGE_LIMIT:
+            return chunk_message(transcript)
+        chunks = chunk_message(transcript, DISCORD_MESSAGE_LIMIT - header_room)
+        return [f"**{part_prefix} {i + 1}/{len(chunks)}:**\n{chunk}" for i, chunk in enumerate(chunks)]
+
+
+_deliveries: Dict[str, DiscordDelivery] = {}
+_deliveries_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="discord")
+
+
+def get_delivery(webhook_url: str) -> DiscordDelivery:
+    with _deliveries_lock:
+        if webhook_url not in _deliveries:
+            _deliveries[webhook_url] = DiscordDelivery(webhook_url)
+        return _deliveries[webhook_url]
+
+
+def send_async(webhook_url: str, transcript: str, part_prefix: str = "Part") -> Future:
+    return _executor.submit(get_delivery(webhook_url).send, transcript, part_prefix)
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Tuple
+
+from audio_io import SAMPLE_RATE, AudioDecodeError, open_pcm
+from metrics import stage
+
+INGEST_CHUNK_BYTES = int(os.environ.get("INGEST_CHUNK_KB", "1024")) * 1024
+# Spooled audio one session may have waiting at a time; further uploads are
+# turned away until its jobs finish.
+SESSION_SPOOL_MB = int(os.environ.get("SESSION_SPOOL_MB", "2048"))
+
+
+@dataclass
+class IngestedFile:
+    path: str
+    sha256: str
+    size: int
+
+
+def copy_to_disk(fileobj: BinaryIO, directory: str, suffix: str,
+                 chunk_bytes: int = INGEST_CHUNK_BYTES) -> Tuple[str, str, int]:
+    # Fixed-size reads keep the copy's own footprint at one chunk; getvalue()
+    # would duplicate the whole upload.
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, suffix=f".part{suffix}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            fileobj.seek(0)
+            for chunk in iter(lambda: fileobj.read(chunk_bytes), b""):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest(), size
+
+
+def extract_audio(source: str, target: str):
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", source,
+        "-vn", "-sn", "-dn",
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-c:a", "pcm_s16le",
+        target
+    ]
+    try:
+        subprocess.run(command, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"Failed to extract audio: {e.stderr.decode(errors='replace').strip()}") from e
+
+
+def ingest(fileobj: BinaryIO, name: str, directory: str) -> IngestedFile:
+    os.makedirs(directory, exist_ok=True)
+    suffix = os.path.splitext(name)[1].lower()
+    with stage("upload_copy"):
+        path, sha256, size = copy_to_disk(fileobj, directory, suffix)
+    return IngestedFile(path, sha256, size)
+
+
+def convert_for_spool(ingested: IngestedFile) -> IngestedFile:
+    # Run only once the cache has missed: a re-upload is recognised from the
+    # hash of the copy and never pays for the conversion.
+    if open_pcm(ingested.path) is not None:
+        return ingested
+    # Everything is spooled as 16 kHz mono PCM, so jobs read a long file a
+    # chunk at a time instead of decoding it whole; a video's other streams
+    # never reach the queue.
+    audio_path = os.path.splitext(ingested.path)[0] + ".pcm.wav"
+    try:
+        with stage("audio_extract"):
+            extract_audio(ingested.path, audio_path)
+    finally:
+        os.unlink(ingested.path)
+    return IngestedFile(audio_path, ingested.sha256, ingested.size)
@@ -0,0 +1,459 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Union
+
+from audio_io import SAMPLE_RATE, load_audio
+from language_id import first_speech_window
+from long_form import LONG_FORM_THRESHOLD_SECONDS, ChunkCheckpoint, LongFormJob, is_long_form
+from metrics import annotate, stage, trace
+from search_index import get_search_index
+from transcriber import BATCH_MAX_CLIPS, BATCH_MAX_SECONDS, MODEL_NAME, AudioTranscriber
+from transcript_cache import CACHE_DIR, get_cache
+from worker_pool import TRANSCRIBE_WORKERS, get_pool, merge_worker_trace
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(max(1, TRANSCRIBE_WORKERS))))
+# Workers that only take clips up to SHORT_JOB_SECONDS, so one session's
+# multi-hour upload does not hold up every other session's mic recordings.
+JOB_SHORT_WORKERS = int(os.environ.get("JOB_SHORT_WORKERS", "1"))
+SHORT_JOB_SECONDS = float(os.environ.get("SHORT_JOB_SECONDS", "60"))
+JOB_POLL_SECONDS = 0.5
+# A job whose worker process keeps dying (e.g. OOM on one huge file) is failed
+# after this many attempts instead of taking the pool down forever.
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# Finished and failed rows are deleted after this long; results outlive them
+# in the transcript cache, which is size-bounded.
+JOB_RETENTION_DAYS = float(os.environ.get("JOB_RETENTION_DAYS", "7"))
+JOB_PRUNE_INTERVAL_SECONDS = 3600
+JOB_DB_PATH = os.path.join(CACHE_DIR, "jobs.sqlite3")
+SPOOL_DIR = os.path.join(CACHE_DIR, "spool")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+logger = logging.getLogger(__name__)
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def index_result(job: Dict[str, Any], result: Dict[str, Any], model_name: str):
+    # The index is a convenience; a failed write must not fail a finished job.
+    try:
+        with stage("search_index"):
+            get_search_index().add(job['dedup_key'], job['name'], result, model_name, job.get('duration'))
+    except sqlite3.Error as e:
+        logger.warning("Could not index %s: %s", job['name'], e)
+
+
+def _discard(payload: Union[bytes, str]):
+    if isinstance(payload, str):
+        try:
+            os.unlink(payload)
+        except OSError:
+            pass
+
+
+class JobQueue:
+    def __init__(self, path: str = JOB_DB_PATH, spool_dir: str = SPOOL_DIR):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(spool_dir, exist_ok=True)
+        self.path = path
+        self.spool_dir = spool_dir
+        self._local = threading.local()
+        self._pruned_at = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, dedup_key TEXT UNIQUE NOT NULL, name TEXT NOT NULL, "
+                "language TEXT, payload_path TEXT NOT NULL, status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, "
+                "result TEXT, error TEXT, owner TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "options TEXT, duration REAL, attempts INTEGER NOT NULL DEFAULT 0, partial TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (('options', "TEXT"), ('duration', "REAL"), ('attempts', "INTEGER NOT NULL DEFAULT 0"),
+                                 ('partial', "TEXT")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self.recover()
+        self.prune()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def recover(self):
+        # Jobs left running by a process on this host that has since died are
+        # put back in the queue; their long-form checkpoints make the retry cheap.
+        host = socket.gethostname()
+        conn = self._connect()
+        for row in conn.execute("SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall():
+            owner_host, _, pid = (row['owner'] or "").rpartition(":")
+            if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                    (QUEUED, time.time(), row['id'], RUNNING)
+                )
+
+    def find(self, dedup_keys: List[str]) -> Optional[str]:
+        # The first of the keys, in the caller's order of preference, that a
+        # queued, running or finished job already holds.
+        if not dedup_keys:
+            return None
+        rows = self._connect().execute(
+            f"SELECT dedup_key FROM jobs WHERE status != ? AND dedup_key IN ({','.join('?' * len(dedup_keys))})",
+            (FAILED, *dedup_keys)
+        ).fetchall()
+        found = {row['dedup_key'] for row in rows}
+        return next((key for key in dedup_keys if key in found), None)
+
+    def prune(self, retention_days: float = JOB_RETENTION_DAYS) -> int:
+        self._pruned_at = time.time()
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, time.time() - retention_days * 86400)
+        )
+        return cursor.rowcount
+
+    def submit(self, data: bytes, name: str, dedup_key: str, language: Optional[str],
+               cached_result: Optional[Dict[str, Any]] = None, options: Optional[Dict[str, Any]] = None,
+               duration: Optional[float] = None) -> str:
+        return self._submit(data, name, dedup_key, language, cached_result, options, duration)
+
+    def submit_path(self, path: str, name: str, dedup_key: str, language: Optional[str],
+                    cached_result: Optional[Dict[str, Any]] = None, options: Optional[Dict[str, Any]] = None,
+                    duration: Optional[float] = None) -> str:
+        # The file is moved into the spool (or deleted if it is not needed), so
+        # it must live on the same filesystem, e.g. in spool_dir.
+        return self._submit(path, name, dedup_key, language, cached_result, options, duration)
+
+    def _submit(self, payload: Union[bytes, str], name: str, dedup_key: str, language: Optional[str],
+                cached_result: Optional[Dict[str, Any]], options: Optional[Dict[str, Any]],
+                duration: Optional[float]) -> str:
+        conn = self._connect()
+        row = conn.execute("SELECT id, status FROM jobs WHERE dedup_key = ?", (dedup_key,)).fetchone()
+        if row is not None and row['status'] != FAILED:
+            _discard(payload)
+            return row['id']
+
+        now = time.time()
+        options_json = json.dumps(options) if options else None
+        if cached_result is not None:
+            _discard(payload)
+            status, payload_path, result = DONE, "", json.dumps(cached_result, ensure_ascii=False)
+            # The cache may predate the search index; add() skips keys it already has.
+            index_result({'dedup_key': dedup_key, 'name': name, 'duration': duration}, cached_result,
+                         (options or {}).get('model', MODEL_NAME))
+        else:
+            suffix = os.path.splitext(payload if isinstance(payload, str) else name)[1].lower()
+            payload_path = os.path.join(self.spool_dir, dedup_key + suffix)
+            with stage("spool_write"):
+                if isinstance(payload, str):
+                    os.replace(payload, payload_path)
+                else:
+                    tmp_path = f"{payload_path}.{uuid.uuid4().hex}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(payload)
+                    os.replace(tmp_path, payload_path)
+            status, result = QUEUED, None
+
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, progress = 0, result = ?, error = NULL, owner = NULL, attempts = 0, "
+                "payload_path = ?, options = ?, duration = ?, updated_at = ? WHERE id = ?",
+                (status, result, payload_path, options_json, duration, now, row['id'])
+            )
+            return row['id']
+
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (id, dedup_key, name, language, payload_path, status, progress, result, "
+            "options, duration, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, dedup_key, name, language, payload_path, status, 1.0 if result else 0.0, result, options_json,
+             duration, now, now)
+        )
+        # Another session may have inserted the same audio between our SELECT and INSERT.
+        return conn.execute("SELECT id FROM jobs WHERE dedup_key = ?", (dedup_key,)).fetchone()['id']
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        jobs = self.claim_batch(1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, limit: int = BATCH_MAX_CLIPS, max_duration: Optional[float] = None) -> List[Dict[str, Any]]:
+        # The oldest job always goes first; if it is a short clip, other short
+        # clips queued with the same language and options join its batch.
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if max_duration is None:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND duration <= ? ORDER BY created_at LIMIT 1",
+                    (QUEUED, max_duration)
+                ).fetchall()
+            if rows and limit > 1 and rows[0]['duration'] is not None and rows[0]['duration'] <= BATCH_MAX_SECONDS:
+                rows += conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND id != ? AND duration <= ? AND language IS ? AND options IS ? "
+                    "ORDER BY created_at LIMIT ?",
+                    (QUEUED, rows[0]['id'], BATCH_MAX_SECONDS, rows[0]['language'], rows[0]['options'], limit - 1)
+                ).fetchall()
+            now = time.time()
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, _owner(), now, row['id'])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [{**dict(row), 'status': RUNNING} for row in rows]
+
+    def set_progress(self, job_id: str, progress: float, partial: Optional[str] = None):
+        self._connect().execute(
+            "UPDATE jobs SET progress = ?, partial = COALESCE(?, partial), updated_at = ? WHERE id = ?",
+            (progress, partial, time.time(), job_id)
+        )
+
+    def retry(self, job_id: str, error: str) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, progress = 0, error = ?, partial = NULL, owner = NULL, attempts = attempts + 1, "
+            "updated_at = ? "
+            "WHERE id = ? AND attempts + 1 < ?",
+            (QUEUED, error, time.time(), job_id, JOB_MAX_ATTEMPTS)
+        )
+        if cursor.rowcount == 0:
+            self.fail(job_id, error)
+            return False
+        return True
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        self._finish(job_id, DONE, result=json.dumps(result, ensure_ascii=False))
+        if time.time() - self._pruned_at > JOB_PRUNE_INTERVAL_SECONDS:
+            self.prune()
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, FAILED, error=error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        conn = self._connect()
+        row = conn.execute("SELECT dedup_key, payload_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.execute(
+            "UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, partial = NULL, owner = NULL, updated_at = ? "
+            "WHERE id = ?",
+            (status, 1.0 if status == DONE else 0.0, result, error, time.time(), job_id)
+        )
+        if row is None:
+            return
+        # Both outcomes are final (retries go through retry()), so nothing
+        # needs the audio or a failed long job's chunk checkpoints any more.
+        if row['payload_path']:
+            _discard(row['payload_path'])
+        if status == FAILED:
+            ChunkCheckpoint(row['dedup_key']).clear()
+
+    def get(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not job_ids:
+            return {}
+        placeholders = ",".join("?" * len(job_ids))
+        rows = self._connect().execute(f"SELECT * FROM jobs WHERE id IN ({placeholders})", list(job_ids)).fetchall()
+        jobs = {}
+        for row in rows:
+            job = dict(row)
+            job['result'] = json.loads(job['result']) if job['result'] else None
+            jobs[job['id']] = job
+        return jobs
+
+    def spooled_bytes(self, job_ids: List[str]) -> int:
+        # Audio still waiting in the spool for these jobs; finished jobs have
+        # had their payload removed.
+        if not job_ids:
+            return 0
+        rows = self._connect().execute(
+            f"SELECT payload_path FROM jobs WHERE status IN (?, ?) AND id IN ({','.join('?' * len(job_ids))})",
+            (QUEUED, RUNNING, *job_ids)
+        ).fetchall()
+        total = 0
+        for row in rows:
+            try:
+                total += os.path.getsize(row['payload_path'])
+            except OSError:
+                pass
+        return total
+
+    def pending_count(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchone()[0]
+
+
+def report_chunk(queue: JobQueue, job_id: str, long_job: LongFormJob):
+    queue.set_progress(job_id, len(long_job.results) / long_job.total, long_job.partial_text())
+
+
+def transcribe_in_pool(queue: JobQueue, job: Dict[str, Any], model_name: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    pool = get_pool()
+    key = job['dedup_key']
+    audio = None
+    if job['duration'] is None or job['duration'] > LONG_FORM_THRESHOLD_SECONDS:
+        audio = load_audio(job['payload_path'])
+    if audio is None or not is_long_form(audio):
+        future = pool.submit_file(job['payload_path'], job['language'], key, model=model_name, **options)
+        return merge_worker_trace(future.result())
+
+    # Long files are split here and their chunks fanned out across the pool;
+    # the parent keeps the checkpoint and reports progress as chunks land.
+    annotate(audio_seconds=round(len(audio) / SAMPLE_RATE, 3), model=model_name)
+    language = job['language']
+    if language is None:
+        # Detected once for the whole file, so chunks cannot disagree.
+        detected = pool.submit_language(first_speech_window(audio), model_name)
+        language = merge_worker_trace(detected.result())['language']
+    long_job = LongFormJob(audio, key)
+    pending = long_job.pending()
+    pending.reverse()
+    in_flight = {}
+    try:
+        while pending or in_flight:
+            # At most one queued chunk per worker, so other jobs interleave
+            # with a long file instead of waiting behind all of its chunks.
+            while pending and len(in_flight) < pool.workers:
+                index = pending.pop()
+                in_flight[pool.submit_chunk(long_job.chunk(index), language, model=model_name, **options)] = index
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                long_job.add_result(in_flight.pop(future), merge_worker_trace(future.result()))
+                report_chunk(queue, job['id'], long_job)
+    finally:
+        for future in in_flight:
+            future.cancel()
+    return long_job.finish()
+
+
+def run_job(queue: JobQueue, job: Dict[str, Any], in_process: bool = False):
+    key = job['dedup_key']
+    options = json.loads(job['options'] or "{}")
+    model_name = options.pop('model', MODEL_NAME)
+    with trace("job", name=job['name'], model=model_name, queued_s=round(time.time() - job['created_at'], 3)):
+        if TRANSCRIBE_WORKERS > 1 and not in_process:
+            result = transcribe_in_pool(queue, job, model_name, options)
+        else:
+            audio = load_audio(job['payload_path'])
+            result = AudioTranscriber(model_name).transcribe_resumable(
+                audio,
+                job['language'],
+                checkpoint_key=key,
+                on_chunk=lambda long_job: report_chunk(queue, job['id'], long_job),
+                **options
+            )
+        with stage("cache_store"):
+            get_cache().put(key, result)
+        index_result(job, result, model_name)
+        queue.complete(job['id'], result)
+
+
+def run_batch(queue: JobQueue, jobs: List[Dict[str, Any]], in_process: bool = False):
+    options = json.loads(jobs[0]['options'] or "{}")
+    model_name = options.pop('model', MODEL_NAME)
+    language = jobs[0]['language']
+    paths = [job['payload_path'] for job in jobs]
+    audio_seconds = round(sum(job['duration'] for job in jobs), 3)
+    with trace("batch", jobs=len(jobs), model=model_name, audio_seconds=audio_seconds):
+        if TRANSCRIBE_WORKERS > 1 and not in_process:
+            future = get_pool().submit_batch(paths, language, model=model_name, **options)
+            outcomes = merge_worker_trace(future.result())['outcomes']
+        else:
+            outcomes = AudioTranscriber(model_name).transcribe_batch_files(paths, language, **options)
+        for job, (result, error) in zip(jobs, outcomes):
+            if error is not None:
+                queue.fail(job['id'], error)
+                continue
+            with stage("cache_store"):
+                get_cache().put(job['dedup_key'], result)
+            index_result(job, result, model_name)
+            queue.complete(job['id'], result)
+
+
+def _worker_loop(queue: JobQueue, max_duration: Optional[float] = None):
+    # Short-lane workers run in this process on the already loaded model; in
+    # pool mode the pool's queue can be full of a long file's chunks.
+    in_process = max_duration is not None
+    while True:
+        try:
+            jobs = queue.claim_batch(max_duration=max_duration)
+        except sqlite3.OperationalError as e:
+            logger.warning("Could not claim a job: %s", e)
+            jobs = []
+        if not jobs:
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+        names = ", ".join(job['name'] for job in jobs)
+        try:
+            if len(jobs) == 1:
+                run_job(queue, jobs[0], in_process)
+            else:
+                run_batch(queue, jobs, in_process)
+        except BrokenProcessPool as e:
+            # The crash was not necessarily caused by these jobs; the pool is
+            # replaced and they go back in the queue.
+            logger.warning("Worker process died while running %s: %s", names, e)
+            get_pool().reset_if_broken()
+            for job_id in _still_running(queue, jobs):
+                queue.retry(job_id, f"worker crashed: {e}")
+        except Exception as e:
+            logger.exception("Job(s) %s failed", names)
+            for job_id in _still_running(queue, jobs):
+                queue.fail(job_id, str(e))
+
+
+def _still_running(queue: JobQueue, jobs: List[Dict[str, Any]]) -> List[str]:
+    return [job_id for job_id, job in queue.get([job['id'] for job in jobs]).items() if job['status'] == RUNNING]
+
+
+_queue: Optional[JobQueue] = None
+_workers: List[threading.Thread] = []
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        if not _workers:
+            for i in range(JOB_WORKERS):
+                thread = threading.Thread(target=_worker_loop, args=(_queue,), name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                _workers.append(thread)
+            for i in range(JOB_SHORT_WORKERS):
+                thread = threading.Thread(target=_worker_loop, args=(_queue, SHORT_JOB_SECONDS),
+                                          name=f"job-worker-short-{i}", daemon=True)
+                thread.start()
+                _workers.append(thread)
+        return _queue
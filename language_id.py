@@ -0,0 +1,81 @@
+import logging
+import sys
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from metrics import annotate, increment, stage
+from transcript_cache import audio_hash, get_cache, make_key
+from vad import detect_speech
+
+AUTO = "auto"
+INTERFACE_LANGUAGES = {'en': "english", 'fr': "french", 'de': "german", 'es': "spanish"}
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+SCAN_BLOCK_SAMPLES = 120 * SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+def decode_languages() -> Dict[str, Optional[str]]:
+    # Importing whisper.tokenizer runs the whisper package and with it torch,
+    # so the full list is only offered once the warm-up has imported it.
+    tokenizer = sys.modules.get("whisper.tokenizer")
+    languages = getattr(tokenizer, "LANGUAGES", INTERFACE_LANGUAGES)
+    return {AUTO: None, **{code: name.title() for code, name in sorted(languages.items(), key=lambda item: item[1])}}
+
+
+def first_speech_window(audio) -> np.ndarray:
+    # Whisper's own detection looks at the first 30 s, which for many
+    # recordings is mostly silence or music before anyone speaks. The file is
+    # scanned a block at a time, so a long one on disk is not read whole.
+    for block_start in range(0, len(audio), SCAN_BLOCK_SAMPLES):
+        spans = detect_speech(audio[block_start:block_start + SCAN_BLOCK_SAMPLES])
+        if spans:
+            start = block_start + spans[0][0]
+            return audio[start:start + WINDOW_SAMPLES]
+    return audio[:WINDOW_SAMPLES]
+
+
+def detect_language(transcriber, window: np.ndarray) -> Tuple[str, float]:
+    model = transcriber.model
+    if not model.is_multilingual:
+        return "en", 1.0
+    import torch
+    import whisper
+    with stage("log_mel"):
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(window), model.dims.n_mels).to(model.device)
+    if transcriber.precision == "fp16":
+        mel = mel.half()
+    with transcriber.entry.lock, stage("language_id"), torch.inference_mode():
+        _, probs = model.detect_language(mel)
+    language = max(probs, key=probs.get)
+    return language, round(float(probs[language]), 4)
+
+
+def resolve_language(transcriber, audio, language: Optional[str]) -> str:
+    if language and language != AUTO:
+        return language
+    return window_language(transcriber, first_speech_window(audio))
+
+
+def window_language(transcriber, window: np.ndarray) -> str:
+    # Keyed on the decoded samples of the window detection looks at, which
+    # the worker pool is sent too, so the same audio hits the cache in every
+    # mode, container or set of decoding options, and long files hash 30 s.
+    cache = get_cache()
+    with stage("hash"):
+        key = make_key(audio_hash(memoryview(np.ascontiguousarray(window))), transcriber.model_name, None,
+                       {'stage': "language_id"})
+    cached: Optional[Dict] = cache.get(key)
+    if cached is not None:
+        increment("whisper_language_id_total", result="cached")
+        annotate(language=cached['language'], language_probability=cached['probability'])
+        return cached['language']
+
+    detected, probability = detect_language(transcriber, window)
+    cache.put(key, {'language': detected, 'probability': probability})
+    increment("whisper_language_id_total", result="detected")
+    annotate(language=detected, language_probability=probability)
+    logger.info("Detected language %s (p=%.2f)", detected, probability)
+    return detected
@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, PcmFile
+from transcript_cache import CACHE_DIR
+from vad import VAD_FRAME_MS, frame_energies
+
+LONG_FORM_THRESHOLD_SECONDS = float(os.environ.get("LONG_FORM_THRESHOLD_SECONDS", "600"))
+LONG_FORM_CHUNK_SECONDS = float(os.environ.get("LONG_FORM_CHUNK_SECONDS", "300"))
+LONG_FORM_OVERLAP_SECONDS = 5.0
+LONG_FORM_SEARCH_SECONDS = 20.0
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "chunks")
+
+# (chunk start, chunk end, owned start, owned end) in samples. Chunks overlap;
+# the owned ranges tile the timeline and decide which copy of a segment wins.
+ChunkPlan = Tuple[int, int, int, int]
+# Long files stay on disk as a PcmFile; only the chunk at hand is read.
+Audio = Union[np.ndarray, PcmFile]
+
+
+def is_long_form(audio: Audio) -> bool:
+    return len(audio) > LONG_FORM_THRESHOLD_SECONDS * SAMPLE_RATE
+
+
+def _quietest_point(audio: Audio, target: int, radius: int) -> int:
+    lo = max(0, target - radius)
+    hi = min(len(audio), target + radius)
+    frame_samples = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    energies = frame_energies(audio[lo:hi], frame_samples)
+    if len(energies) == 0:
+        return target
+    return lo + int(np.argmin(energies)) * frame_samples + frame_samples // 2
+
+
+def plan_chunks(audio: Audio, chunk_seconds: float = LONG_FORM_CHUNK_SECONDS,
+                overlap_seconds: float = LONG_FORM_OVERLAP_SECONDS) -> List[ChunkPlan]:
+    total = len(audio)
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    radius = int(LONG_FORM_SEARCH_SECONDS * SAMPLE_RATE)
+
+    cuts = [0]
+    while total - cuts[-1] > chunk + radius:
+        cuts.append(_quietest_point(audio, cuts[-1] + chunk, radius))
+    cuts.append(total)
+
+    return [
+        (max(0, owned_start - overlap), min(total, owned_end + overlap), owned_start, owned_end)
+        for owned_start, owned_end in zip(cuts, cuts[1:])
+    ]
+
+
+def _words(text: str) -> List[str]:
+    return [re.sub(r"[^\w']", "", word.lower()) for word in text.split()]
+
+
+def _drop_repeated_prefix(previous: str, text: str, max_words: int = 8) -> str:
+    tail = _words(previous)[-max_words:]
+    head_raw = text.split()
+    head = _words(text)[:max_words]
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return " " + " ".join(head_raw[size:]) if len(head_raw) > size else ""
+    return text
+
+
+def stitch(plans: List[ChunkPlan], results: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    segments = []
+    for index, (start, _, owned_start, owned_end) in enumerate(plans):
+        result = results.get(index)
+        if result is None:
+            continue
+        offset = start / SAMPLE_RATE
+        for segment in result['segments']:
+            seg_start = segment['start'] + offset
+            seg_end = segment['end'] + offset
+            midpoint = (seg_start + seg_end) / 2 * SAMPLE_RATE
+            if not owned_start <= midpoint < owned_end:
+                continue
+            text = segment['text']
+            if segments and index > 0 and segments[-1]['chunk'] == index - 1:
+                # A word cut by the owned boundary can be transcribed by both chunks.
+                text = _drop_repeated_prefix(segments[-1]['text'], text)
+            if text.strip():
+                segments.append({'start': round(seg_start, 3), 'end': round(seg_end, 3), 'text': text, 'chunk': index})
+
+    for segment in segments:
+        del segment['chunk']
+    languages = [results[i].get('language') for i in sorted(results) if results[i].get('language')]
+    return {
+        'text': "".join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': languages[0] if languages else None,
+        'chunks': len(plans),
+    }
+
+
+class ChunkCheckpoint:
+    def __init__(self, key: str, directory: str = CHECKPOINT_DIR):
+        self.path = os.path.join(directory, key)
+
+    def load(self) -> Dict[int, Dict[str, Any]]:
+        results = {}
+        if not os.path.isdir(self.path):
+            return results
+        for name in os.listdir(self.path):
+            match = re.fullmatch(r"chunk_(\d+)\.json", name)
+            if not match:
+                continue
+            try:
+                with open(os.path.join(self.path, name), encoding="utf-8") as f:
+                    results[int(match.group(1))] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        return results
+
+    def save(self, index: int, result: Dict[str, Any]):
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, f"chunk_{index:04d}.json"))
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class LongFormJob:
+    def __init__(self, audio: Audio, key: str):
+        self.audio = audio
+        self.plans = plan_chunks(audio)
+        self.checkpoint = ChunkCheckpoint(key)
+        # Resume: chunks finished by an earlier, interrupted attempt are reused.
+        self.results = {i: r for i, r in self.checkpoint.load().items() if i < len(self.plans)}
+
+    @property
+    def total(self) -> int:
+        return len(self.plans)
+
+    @property
+    def done(self) -> bool:
+        return len(self.results) == len(self.plans)
+
+    def pending(self) -> List[int]:
+        return [index for index in range(len(self.plans)) if index not in self.results]
+
+    def chunk(self, index: int) -> np.ndarray:
+        start, end, _, _ = self.plans[index]
+        return self.audio[start:end]
+
+    def add_result(self, index: int, result: Dict[str, Any]):
+        self.results[index] = result
+        self.checkpoint.save(index, result)
+
+    def partial_text(self) -> str:
+        return stitch(self.plans, self.results)['text']
+
+    def finish(self) -> Dict[str, Any]:
+        result = stitch(self.plans, self.results)
+        self.checkpoint.clear()
+        return result
+
+
+def transcribe_long(transcribe_chunk: Callable[[np.ndarray], Dict[str, Any]], audio: Audio, key: str,
+                    on_chunk: Optional[Callable[[LongFormJob], None]] = None) -> Dict[str, Any]:
+    job = LongFormJob(audio, key)
+    for index in job.pending():
+        job.add_result(index, transcribe_chunk(job.chunk(index)))
+        if on_chunk:
+            on_chunk(job)
+    return job.finish()
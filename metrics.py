@@ -0,0 +1,247 @@
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+METRICS_FILE = os.environ.get("METRICS_FILE")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+RECENT_TRACES = 50
+
+logger = logging.getLogger("metrics")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Trace:
+    def __init__(self, kind: str, **attributes):
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.started = time.time()
+        self.total = 0.0
+        # Child time of the open stages, so each stage is recorded exclusive
+        # of the stages nested inside it.
+        self._stack: List[float] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'kind': self.kind,
+            'started': round(self.started, 3),
+            'total_s': round(self.total, 4),
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            **self.attributes,
+        }
+        audio_seconds = self.attributes.get('audio_seconds')
+        if audio_seconds:
+            data['rtf'] = round(self.total / audio_seconds, 4)
+        return data
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+_histograms: Dict[Tuple[str, Labels], List[float]] = {}
+_gauges: Dict[Tuple[str, Labels], float] = {}
+_recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_TRACES)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1.0, **labels):
+    with _lock:
+        _counters[(name, _labels(labels))] += value
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[(name, _labels(labels))] = value
+
+
+def observe(name: str, value: float, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        # Cumulative bucket counts, then sum and count, as Prometheus expects.
+        histogram = _histograms.setdefault(key, [0.0] * (len(STAGE_BUCKETS) + 2))
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+def annotate(**attributes):
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def record_stage(name: str, seconds: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.stages[name] += seconds
+        if trace._stack:
+            trace._stack[-1] += seconds
+    observe("whisper_stage_seconds", seconds, stage=name)
+
+
+def merge_stages(stages: Dict[str, float]):
+    for name, seconds in stages.items():
+        record_stage(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    trace = _current.get()
+    if trace is not None:
+        trace._stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        child = trace._stack.pop() if trace is not None else 0.0
+        record_stage(name, elapsed - child)
+
+
+def timed_call(name: str, fn: Callable) -> Callable:
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+    wrapper.__wrapped__ = fn
+    return wrapper
+
+
+@contextmanager
+def trace(kind: str, **attributes) -> Iterator[Trace]:
+    current = Trace(kind, **attributes)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attributes['error'] = str(e)
+        raise
+    finally:
+        current.total = time.perf_counter() - start
+        _current.reset(token)
+        _finish(current)
+
+
+def _finish(current: Trace):
+    data = current.to_dict()
+    status = "error" if 'error' in current.attributes else "ok"
+    increment("whisper_requests_total", kind=current.kind, status=status)
+    observe("whisper_request_seconds", current.total, kind=current.kind)
+    if current.attributes.get('audio_seconds'):
+        increment("whisper_audio_seconds_total", current.attributes['audio_seconds'], kind=current.kind)
+        observe("whisper_real_time_factor", data['rtf'], kind=current.kind)
+    with _lock:
+        _recent.append(data)
+    logger.info(json.dumps(data, ensure_ascii=False, default=str))
+    if METRICS_FILE:
+        write_metrics_file(METRICS_FILE)
+
+
+def recent_traces() -> List[Dict[str, Any]]:
+    with _lock:
+        return list(reversed(_recent))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((key, list(values)) for key, values in _histograms.items())
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), value in gauges:
+        if name not in seen:
+            lines.append(f"# TYPE {name} gauge")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), values in histograms:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, count in zip(STAGE_BUCKETS, values):
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {count:g}")
+        lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {values[-1]:g}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {values[-1]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    routes: Dict[str, Callable[[], Tuple[int, str]]] = {
+        '/metrics': lambda: (200, render_prometheus()),
+        '/healthz': lambda: (200, "ok\n"),
+    }
+
+    def do_GET(self):
+        route = self.routes.get(self.path.split("?")[0])
+        status, body = route() if route else (404, "not found\n")
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def register_route(path: str, handler: Callable[[], Tuple[int, str]]):
+    _MetricsHandler.routes[path] = handler
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_attempted = False
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    global _server, _server_attempted
+    if not port:
+        return None
+    with _server_lock:
+        if not _server_attempted:
+            _server_attempted = True
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                # Another Streamlit process on this host already serves the port.
+                logger.warning("Metrics endpoint not started on port %d: %s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
@@ -0,0 +1,157 @@
+import io
+import json
+import logging
+import os
+import subprocess
+import wave
+from dataclasses import asdict, dataclass, field
+from typing import Any, Collection, Dict, List, Optional, Tuple, Union
+
+from metrics import annotate, increment
+from model_registry import DEFAULT_PRECISION, estimate_nbytes, loaded_models
+from transcriber import MODEL_NAME
+from worker_pool import TRANSCRIBE_WORKERS, get_pool
+
+LATENCY_BUDGET_SECONDS = float(os.environ.get("LATENCY_BUDGET_SECONDS", "60"))
+MODEL_LADDER = [name.strip() for name in os.environ.get("MODEL_LADDER", "tiny,base,small,medium").split(",") if name.strip()]
+
+# Seconds of compute per second of audio with greedy decoding on a CPU host,
+# measured with benchmark.py; override with MODEL_POLICY_RTF='{"small": 0.4}'.
+MODEL_RTF = {
+    'tiny': 0.04,
+    'base': 0.08,
+    'small': 0.25,
+    'medium': 0.8,
+    'large': 1.8,
+    'turbo': 0.5,
+}
+MODEL_RTF.update(json.loads(os.environ.get("MODEL_POLICY_RTF", "{}")))
+# Rough seconds to read a model's weights and build it on a CPU host; only
+# paid when the model is not already in memory. Override with
+# MODEL_POLICY_LOAD_SECONDS='{"medium": 20}'.
+MODEL_LOAD_SECONDS = {
+    'tiny': 1.0,
+    'base': 1.5,
+    'small': 4.0,
+    'medium': 12.0,
+    'large': 25.0,
+    'turbo': 12.0,
+}
+MODEL_LOAD_SECONDS.update(json.loads(os.environ.get("MODEL_POLICY_LOAD_SECONDS", "{}")))
+BEAM_SIZE = 5
+BEAM_COST = 1.6
+FALLBACK_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+logger = logging.getLogger("model_policy")
+
+
+@dataclass
+class Decision:
+    model_name: str
+    options: Dict[str, Any] = field(default_factory=dict)
+    duration: Optional[float] = None
+    budget: float = LATENCY_BUDGET_SECONDS
+    queue_depth: int = 0
+    estimated_seconds: Optional[float] = None
+    reason: str = ""
+
+
+def _wav_duration(source) -> Optional[float]:
+    try:
+        with wave.open(source) as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+def _ffprobe_duration(source: str, data: Optional[bytes] = None) -> Optional[float]:
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", "-i", source],
+            input=data, capture_output=True, check=True, timeout=10
+        ).stdout
+        return float(out.strip())
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return None
+
+
+def probe_duration(source: Union[bytes, str]) -> Optional[float]:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            is_wav = f.read(4) == b"RIFF"
+        duration = _wav_duration(source) if is_wav else None
+        return duration if duration is not None else _ffprobe_duration(source)
+    duration = _wav_duration(io.BytesIO(source)) if source[:4] == b"RIFF" else None
+    # MP4 with a trailing moov atom cannot be probed through a pipe; that gives None.
+    return duration if duration is not None else _ffprobe_duration("pipe:0", source)
+
+
+def _options(beam: bool, fallback: bool) -> Dict[str, Any]:
+    options: Dict[str, Any] = {}
+    if beam:
+        options['beam_size'] = BEAM_SIZE
+    # Without fallback a failed window is not re-decoded at higher temperatures,
+    # which caps the worst case at one decode per window.
+    options['temperature'] = FALLBACK_TEMPERATURES if fallback else (0.0,)
+    return options
+
+
+def models_at_least(model_name: str, ladder: List[str] = MODEL_LADDER) -> List[str]:
+    # Largest first: results from any of these are good enough for a request
+    # the policy would serve with model_name.
+    if model_name not in ladder:
+        return [model_name]
+    return ladder[ladder.index(model_name):][::-1]
+
+
+def choose(duration: Optional[float], queue_depth: int = 0, workers: int = 1,
+           budget: float = LATENCY_BUDGET_SECONDS, ladder: List[str] = MODEL_LADDER,
+           loaded: Optional[Collection[str]] = None, free_bytes: Optional[int] = None) -> Decision:
+    # loaded=None means the models in memory are unknown and no load cost is counted.
+    if duration is None or not ladder:
+        return Decision(MODEL_NAME, budget=budget, queue_depth=queue_depth, reason="duration unknown")
+
+    # Jobs ahead in the queue share the workers, so each gets a slice of the budget.
+    share = budget / (1 + queue_depth / max(1, workers))
+    candidates: List[Tuple[str, bool, float]] = []
+    for model_name in ladder:
+        rtf = MODEL_RTF.get(model_name)
+        if rtf is None:
+            continue
+        load = 0.0
+        if loaded is not None and model_name not in loaded:
+            # A model that only fits by evicting a loaded one would be swapped
+            # back out by the next request that wants the evicted model.
+            nbytes = estimate_nbytes(model_name, DEFAULT_PRECISION or "fp32")
+            if loaded and free_bytes is not None and nbytes > free_bytes:
+                continue
+            load = MODEL_LOAD_SECONDS.get(model_name, 0.0)
+        candidates.append((model_name, False, duration * rtf + load))
+        candidates.append((model_name, True, duration * rtf * BEAM_COST + load))
+    if not candidates:
+        return Decision(MODEL_NAME, duration=duration, budget=budget, queue_depth=queue_depth,
+                        reason="no speed estimate for the model ladder")
+
+    for model_name, beam, estimate in reversed(candidates):
+        if estimate <= share:
+            return Decision(model_name, _options(beam, True), duration, budget, queue_depth, round(estimate, 2),
+                            "largest model within budget")
+
+    model_name, _, estimate = min(candidates, key=lambda c: c[2])
+    return Decision(model_name, _options(False, False), duration, budget, queue_depth, round(estimate, 2),
+                    "over budget with the smallest model")
+
+
+def decide(source: Union[bytes, str], queue_depth: int = 0, workers: int = 1,
+           budget: float = LATENCY_BUDGET_SECONDS) -> Decision:
+    # With the worker pool each worker loads its own copy of the chosen model,
+    # so the pool's view counts, not this process's registry.
+    if TRANSCRIBE_WORKERS > 1:
+        loaded, free_bytes = get_pool().loaded_models()
+    else:
+        loaded, free_bytes = loaded_models()
+    decision = choose(probe_duration(source), queue_depth, workers, budget, loaded=loaded, free_bytes=free_bytes)
+    logger.info(json.dumps(asdict(decision), ensure_ascii=False))
+    increment("whisper_policy_decisions_total", model=decision.model_name)
+    annotate(policy_model=decision.model_name, policy_reason=decision.reason)
+    return decision
@@ -0,0 +1,245 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set, Tuple
+
+from metrics import annotate, increment, stage
+
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("WHISPER_MODEL_MEMORY_MB", "4096"))
+# fp32, fp16 (CUDA only) or int8 (CPU only, dynamic quantization of the Linear layers).
+DEFAULT_PRECISION = os.environ.get("WHISPER_PRECISION") or None
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", "0"))
+PRECISIONS = ['fp32', 'fp16', 'int8']
+
+# Rough fp32 footprints, used to make room before a load when the real size is not known yet.
+APPROX_MODEL_MB = {
+    'tiny': 150,
+    'base': 290,
+    'small': 970,
+    'medium': 3060,
+    'large': 6170,
+    'turbo': 3240,
+}
+
+ModelKey = Tuple[str, str, str]
+
+
+@dataclass
+class ModelEntry:
+    key: ModelKey
+    model: Any
+    nbytes: int
+    # Whisper installs kv-cache hooks on the shared decoder modules for every
+    # decode, so two concurrent transcriptions on one model corrupt each other.
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def resolve_device(device: Optional[str] = None) -> str:
+    if device:
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def resolve_precision(device: str, precision: Optional[str] = None) -> str:
+    precision = precision or DEFAULT_PRECISION
+    on_cuda = device.startswith("cuda")
+    if precision is None:
+        return "fp16" if on_cuda else "fp32"
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+    if precision == "fp16" and not on_cuda:
+        return "fp32"
+    if precision == "int8" and on_cuda:
+        return "fp16"
+    return precision
+
+
+_threads_configured = False
+
+
+def configure_cpu_threads(threads: int = 0):
+    global _threads_configured
+    import torch
+    threads = threads or TORCH_THREADS
+    if threads:
+        torch.set_num_threads(threads)
+    # Whisper runs one decode graph at a time, so inter-op parallelism only
+    # adds threads competing with the intra-op pool. Torch refuses the change
+    # once any parallel work has run; the default is then kept.
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    _threads_configured = True
+
+
+def quantize_int8(model):
+    # Whisper's Linear subclass only casts weights to the input dtype, but
+    # quantize_dynamic matches module types exactly and would skip it.
+    import torch
+    import whisper
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def model_nbytes(model) -> int:
+    # state_dict rather than parameters(): quantized Linear weights live in
+    # packed params, not in parameters.
+    import torch
+    total = 0
+    for value in model.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def estimate_nbytes(model_name: str, precision: str) -> int:
+    base_name = model_name.split('.')[0].split('-')[0]
+    mb = APPROX_MODEL_MB.get(base_name, 0)
+    if precision == "fp16":
+        mb //= 2
+    elif precision == "int8":
+        # Token embeddings and convolutions stay fp32.
+        mb = mb * 2 // 5
+    return mb * 1024 * 1024
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget_mb: int = MODEL_MEMORY_BUDGET_MB):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._entries: "OrderedDict[ModelKey, ModelEntry]" = OrderedDict()
+        self._loading: Dict[ModelKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_name: str, device: Optional[str] = None, precision: Optional[str] = None) -> ModelEntry:
+        device = resolve_device(device)
+        precision = resolve_precision(device, precision)
+        key = (model_name, device, precision)
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given key; the others wait here and then hit.
+        with load_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry
+                self.misses += 1
+                self._evict_for(estimate_nbytes(model_name, precision))
+            increment("whisper_model_cache_requests_total", result="miss")
+            annotate(model_cache="miss")
+
+            with stage("model_load"):
+                model = self._load(model_name, device, precision)
+            entry = ModelEntry(key=key, model=model, nbytes=model_nbytes(model))
+
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self._evict_for(0, keep=key)
+                self._loading.pop(key, None)
+            return entry
+
+    def _lookup(self, key: ModelKey) -> Optional[ModelEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            increment("whisper_model_cache_requests_total", result="hit")
+            annotate(model_cache="hit")
+        return entry
+
+    def _load(self, model_name: str, device: str, precision: str):
+        import whisper
+        model = whisper.load_model(model_name, device=device)
+        if precision == "fp16":
+            model = model.half()
+        elif precision == "int8":
+            model = quantize_int8(model)
+        model.eval()
+        return model
+
+    def _evict_for(self, incoming: int, keep: Optional[ModelKey] = None):
+        while self._entries and self.memory_used() + incoming > self.memory_budget:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            # In-flight transcriptions hold their own reference, so dropping it
+            # here only frees the weights once they finish.
+            del self._entries[oldest]
+            self.evictions += 1
+
+    def memory_used(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def evict(self, model_name: str, device: Optional[str] = None, precision: Optional[str] = None) -> bool:
+        device = resolve_device(device)
+        key = (model_name, device, resolve_precision(device, precision))
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def loaded(self) -> Tuple[Set[str], int]:
+        with self._lock:
+            return {key[0] for key in self._entries}, self.memory_budget - self.memory_used()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'models': [list(key) for key in self._entries],
+                'memory_used_mb': round(self.memory_used() / (1024 * 1024), 1),
+                'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if not _threads_configured:
+                configure_cpu_threads()
+            _registry = ModelRegistry()
+        return _registry
+
+
+def available_memory() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def loaded_models() -> Tuple[Set[str], int]:
+    # Does not create the registry: that configures torch, which the UI
+    # thread must not wait for while warm-up is still importing it.
+    with _registry_lock:
+        registry = _registry
+    if registry is None:
+        return set(), MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+    return registry.loaded()
@@ -0,0 +1,171 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from metrics import increment, observe
+from transcript_cache import CACHE_DIR
+
+SEARCH_DB_PATH = os.environ.get("SEARCH_DB_PATH", os.path.join(CACHE_DIR, "search.sqlite3"))
+SEARCH_LIMIT = 50
+SNIPPET_TOKENS = 16
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchHit:
+    transcript_id: int
+    source: str
+    start: float
+    end: float
+    snippet: str
+    language: Optional[str]
+    model: Optional[str]
+    created_at: float
+    score: float
+
+
+def fts_query(text: str) -> str:
+    # User input is passed as quoted strings so characters FTS5 treats as
+    # syntax (-, :, parentheses, AND/OR) are searched for literally. Quoted
+    # input stays a phrase; a trailing * asks for a prefix match, which is never
+    # added implicitly because a short prefix can match most of the index.
+    parts = []
+    for match in re.finditer(r'"([^"]*)"|(\S+)', text):
+        phrase, word = match.groups()
+        prefix = word is not None and len(word) > 1 and word.endswith("*")
+        term = phrase if phrase is not None else word.rstrip("*") if prefix else word
+        if re.search(r"\w", term):
+            parts.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(parts)
+
+
+class SearchIndex:
+    def __init__(self, path: str = SEARCH_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self.enabled = True
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, source TEXT NOT NULL, language TEXT, "
+                "model TEXT, duration REAL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                "id INTEGER PRIMARY KEY, transcript_id INTEGER NOT NULL, start REAL NOT NULL, end REAL NOT NULL, "
+                "text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS segments_transcript ON segments (transcript_id)")
+            try:
+                # External content: the text is stored once, in segments, and
+                # the FTS table only holds the inverted index.
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5("
+                    "text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                )
+            except sqlite3.OperationalError as e:
+                # SQLite builds without FTS5 still run the app, just without search.
+                logger.warning("Transcript search disabled: %s", e)
+                self.enabled = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, key: str, source: str, result: Dict[str, Any], model: Optional[str] = None,
+            duration: Optional[float] = None) -> Optional[int]:
+        if not self.enabled:
+            return None
+        segments = [seg for seg in result.get('segments', []) if seg['text'].strip()]
+        if not segments and result.get('text', "").strip():
+            segments = [{'start': 0.0, 'end': duration or 0.0, 'text': result['text']}]
+        if not segments:
+            return None
+        if duration is None:
+            duration = max(float(seg['end']) for seg in segments)
+
+        conn = self._connect()
+        with conn:
+            # The key is the job's dedup key, so a re-upload or a cache hit of
+            # the same audio and settings is not indexed twice.
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO transcripts (key, source, language, model, duration, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source, result.get('language'), model, duration, time.time())
+            )
+            if cursor.rowcount == 0:
+                return None
+            transcript_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO segments (transcript_id, start, end, text) VALUES (?, ?, ?, ?)",
+                [(transcript_id, float(seg['start']), float(seg['end']), seg['text'].strip()) for seg in segments]
+            )
+            conn.execute(
+                "INSERT INTO segments_fts (rowid, text) SELECT id, text FROM segments WHERE transcript_id = ?",
+                (transcript_id,)
+            )
+        increment("whisper_search_indexed_total")
+        return transcript_id
+
+    def search(self, text: str, limit: int = SEARCH_LIMIT) -> List[SearchHit]:
+        query = fts_query(text)
+        if not self.enabled or not query:
+            return []
+        started = time.perf_counter()
+        try:
+            rows = self._connect().execute(
+                "SELECT s.transcript_id, t.source, s.start, s.end, t.language, t.model, t.created_at, "
+                f"snippet(segments_fts, 0, '**', '**', '…', {SNIPPET_TOKENS}) AS snippet, "
+                "bm25(segments_fts) AS score "
+                "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid "
+                "JOIN transcripts t ON t.id = s.transcript_id "
+                "WHERE segments_fts MATCH ? ORDER BY rank LIMIT ?",
+                (query, limit)
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning("Search for %r failed: %s", text, e)
+            return []
+        observe("whisper_search_seconds", time.perf_counter() - started)
+        return [
+            SearchHit(row['transcript_id'], row['source'], row['start'], row['end'], row['snippet'],
+                      row['language'], row['model'], row['created_at'], row['score'])
+            for row in rows
+        ]
+
+    def optimize(self):
+        # Merges the FTS segment b-trees; worth running after bulk indexing.
+        if self.enabled:
+            with self._connect() as conn:
+                conn.execute("INSERT INTO segments_fts (segments_fts) VALUES ('optimize')")
+
+    def stats(self) -> Dict[str, Any]:
+        # Segments are not counted: that scans the largest table on every call.
+        count, seconds = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(duration), 0) FROM transcripts"
+        ).fetchone()
+        return {'transcripts': count, 'hours': round(seconds / 3600, 1)}
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex()
+        return _index
@@ -0,0 +1,40 @@
+import argparse
+import logging
+import os
+import sys
+
+from metrics import METRICS_PORT, start_http_server
+from warmup import start_warmup
+
+HEALTH_PORT = int(os.environ.get("HEALTH_PORT", str(METRICS_PORT or 8502)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Start the model warm-up and the health endpoint, then run the Streamlit app in this process"
+    )
+    parser.add_argument("--health-port", type=int, default=HEALTH_PORT,
+                        help="port for /healthz, /readyz and /metrics (0 disables it)")
+    parser.add_argument("streamlit_args", nargs=argparse.REMAINDER,
+                        help="arguments passed on to `streamlit run`, e.g. --server.port 8501")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # `streamlit run` only executes app.py when the first browser session
+    # connects; starting here lets the model load while the pod is still
+    # failing its readiness probe. The app shares this process's modules, so
+    # it finds the warmed registry.
+    start_warmup()
+    start_http_server(args.health_port)
+
+    from streamlit.web.cli import main as streamlit_main
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    sys.argv = ["streamlit", "run", app_path, *args.streamlit_args]
+    sys.exit(streamlit_main())
+
+
+if __name__ == "__main__":
+    main()
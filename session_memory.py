@@ -0,0 +1,216 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import set_gauge
+from transcript_cache import CACHE_DIR
+
+RECORDING_STORE_DIR = os.environ.get("RECORDING_STORE_DIR", os.path.join(CACHE_DIR, "recordings"))
+RECORDING_FORMAT = os.environ.get("RECORDING_FORMAT", "opus")
+RECORDINGS_PER_SESSION = int(os.environ.get("RECORDINGS_PER_SESSION", "20"))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+EVICTION_INTERVAL_SECONDS = 60
+
+ENCODINGS = {
+    'opus': (".ogg", "audio/ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]),
+    'flac': (".flac", "audio/flac", ["-c:a", "flac"]),
+}
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Recording:
+    mime: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    disk_bytes: int = 0
+
+
+@dataclass
+class SessionData:
+    last_seen: float = field(default_factory=time.time)
+    recordings: "OrderedDict[str, Recording]" = field(default_factory=OrderedDict)
+    # Sizes of objects the session keeps in st.session_state, reported by the app.
+    external_bytes: Dict[str, int] = field(default_factory=dict)
+
+    def memory_bytes(self) -> int:
+        held = sum(len(rec.data) for rec in self.recordings.values() if rec.data is not None)
+        return held + sum(self.external_bytes.values())
+
+    def disk_bytes(self) -> int:
+        return sum(rec.disk_bytes for rec in self.recordings.values())
+
+
+def compress(data: bytes, target_base: str, encoding: str = RECORDING_FORMAT) -> Tuple[str, str]:
+    suffix, mime, codec = ENCODINGS.get(encoding, ENCODINGS['opus'])
+    path = target_base + suffix
+    try:
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", "pipe:0", *codec, path],
+            input=data, capture_output=True, check=True
+        )
+        return path, mime
+    except (subprocess.CalledProcessError, OSError) as e:
+        # An ffmpeg build without the encoder still gets the memory back;
+        # the recording is spilled as-is.
+        logger.warning("Could not compress recording, storing it uncompressed: %s", e)
+        if os.path.exists(path):
+            os.unlink(path)
+        path = target_base + ".wav"
+        with open(path, "wb") as f:
+            f.write(data)
+        return path, "audio/wav"
+
+
+class SessionMemory:
+    def __init__(self, store_dir: str = RECORDING_STORE_DIR, ttl: float = SESSION_TTL_SECONDS):
+        self.store_dir = store_dir
+        self.ttl = ttl
+        self._sessions: Dict[str, SessionData] = {}
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+        # Files left by a server that exited without evicting them; other
+        # processes sharing the directory keep theirs fresher than the TTL
+        # through refresh_spilled().
+        cutoff = time.time() - ttl
+        for entry in os.scandir(store_dir):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+
+    def _session(self, session_id: str) -> SessionData:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = SessionData()
+        session.last_seen = time.time()
+        return session
+
+    def touch(self, session_id: str, **external_bytes: int):
+        with self._lock:
+            self._session(session_id).external_bytes.update(external_bytes)
+
+    def add_recording(self, session_id: str, data: bytes, mime: str = "audio/wav") -> str:
+        recording_id = uuid.uuid4().hex
+        with self._lock:
+            session = self._session(session_id)
+            session.recordings[recording_id] = Recording(mime, data=data)
+            while len(session.recordings) > RECORDINGS_PER_SESSION:
+                _, oldest = session.recordings.popitem(last=False)
+                _remove(oldest)
+        return recording_id
+
+    def spill(self, session_id: str, recording_id: str):
+        with self._lock:
+            recording = self._sessions.get(session_id, SessionData()).recordings.get(recording_id)
+            data = recording.data if recording is not None else None
+        if data is None:
+            return
+        # Compression runs outside the lock; other sessions are not held up by ffmpeg.
+        path, mime = compress(data, os.path.join(self.store_dir, f"{session_id}_{recording_id}"))
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or recording_id not in session.recordings:
+                _remove(Recording(mime, path=path))
+                return
+            recording.path, recording.mime, recording.data = path, mime, None
+            recording.disk_bytes = os.path.getsize(path)
+
+    def recording(self, session_id: str, recording_id: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            recording = self._session(session_id).recordings.get(recording_id)
+        if recording is None:
+            return None
+        if recording.data is not None:
+            return recording.data, recording.mime
+        try:
+            with open(recording.path, "rb") as f:
+                return f.read(), recording.mime
+        except OSError:
+            return None
+
+    def drop(self, session_id: str):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            for recording in session.recordings.values():
+                _remove(recording)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        with self._lock:
+            idle = [sid for sid, session in self._sessions.items() if now - session.last_seen > self.ttl]
+        for session_id in idle:
+            self.drop(session_id)
+        if idle:
+            logger.info("Evicted %d idle session(s)", len(idle))
+        return len(idle)
+
+    def refresh_spilled(self):
+        # A spilled file is written once; its mtime is bumped while its
+        # session is alive so no process's startup sweep takes it for garbage.
+        with self._lock:
+            paths = [rec.path for s in self._sessions.values() for rec in s.recordings.values() if rec.path]
+        for path in paths:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def footprint(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            session = self._sessions.get(session_id, SessionData())
+            return {
+                'memory_bytes': session.memory_bytes(),
+                'disk_bytes': session.disk_bytes(),
+                'recordings': len(session.recordings),
+                **{f"{name}_bytes": size for name, size in session.external_bytes.items()},
+            }
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            totals = {
+                'sessions': len(self._sessions),
+                'memory_bytes': sum(s.memory_bytes() for s in self._sessions.values()),
+                'disk_bytes': sum(s.disk_bytes() for s in self._sessions.values()),
+            }
+        for name, value in totals.items():
+            set_gauge(f"whisper_session_{name}", value)
+        return totals
+
+
+def _remove(recording: Recording):
+    if recording.path:
+        try:
+            os.unlink(recording.path)
+        except OSError:
+            pass
+
+
+def _evict_loop(manager: SessionMemory):
+    while True:
+        time.sleep(EVICTION_INTERVAL_SECONDS)
+        try:
+            manager.evict_idle()
+            manager.refresh_spilled()
+            manager.totals()
+        except Exception:
+            logger.exception("Session eviction failed")
+
+
+_manager: Optional[SessionMemory] = None
+_manager_lock = threading.Lock()
+
+
+def get_session_memory() -> SessionMemory:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionMemory()
+            threading.Thread(target=_evict_loop, args=(_manager,), name="session-eviction", daemon=True).start()
+        return _manager
@@ -0,0 +1,119 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from transcriber import AudioTranscriber
+
+STREAM_CHUNK_SECONDS = float(os.environ.get("STREAM_CHUNK_SECONDS", "2.0"))
+STREAM_MAX_BUFFER_SECONDS = float(os.environ.get("STREAM_MAX_BUFFER_SECONDS", "20.0"))
+STREAM_PROMPT_CHARS = 200
+
+Word = Tuple[float, float, str]
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def words_to_segment(words: List[Word]) -> Dict[str, Any]:
+    # Times are seconds since the stream started.
+    return {'start': words[0][0], 'end': words[-1][1], 'text': "".join(word for _, _, word in words)}
+
+
+# Local agreement: the sliding buffer is re-transcribed every chunk and words
+# that two consecutive passes agree on are committed. The buffer is trimmed to
+# the end of the committed words, whose text becomes the next prompt.
+class StreamingTranscriber:
+    def __init__(self, transcriber: AudioTranscriber, language: Optional[str] = "en",
+                 chunk_seconds: float = STREAM_CHUNK_SECONDS, max_buffer_seconds: float = STREAM_MAX_BUFFER_SECONDS):
+        self.transcriber = transcriber
+        self.language = language
+        self.chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+        self.max_buffer_samples = int(max_buffer_seconds * SAMPLE_RATE)
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_offset = 0.0
+        self.unprocessed = 0
+        self.committed: List[Word] = []
+        self.hypothesis: List[Word] = []
+
+    @property
+    def committed_text(self) -> str:
+        return "".join(word for _, _, word in self.committed).strip()
+
+    @property
+    def pending_text(self) -> str:
+        return "".join(word for _, _, word in self.hypothesis).strip()
+
+    def feed(self, samples: np.ndarray) -> List[Word]:
+        self.buffer = np.concatenate([self.buffer, samples.astype(np.float32)])
+        self.unprocessed += len(samples)
+        if self.unprocessed < self.chunk_samples:
+            return []
+        self.unprocessed = 0
+        return self._process()
+
+    def finish(self) -> List[Word]:
+        if len(self.buffer) == 0:
+            return []
+        words = self._transcribe_buffer()
+        self.hypothesis = []
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.unprocessed = 0
+        return self._commit(words)
+
+    def _transcribe_buffer(self) -> List[Word]:
+        result = self.transcriber.transcribe(
+            self.buffer,
+            self.language,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=self.committed_text[-STREAM_PROMPT_CHARS:] or None
+        )
+        last_end = self.committed[-1][1] if self.committed else 0.0
+        words = []
+        for segment in result.get('segments', []):
+            for word in segment.get('words', []):
+                start = self.buffer_offset + word['start']
+                end = self.buffer_offset + word['end']
+                # Words straddling the trim point were already committed.
+                if end > last_end + 0.05:
+                    words.append((start, end, word['word']))
+        return words
+
+    def _process(self) -> List[Word]:
+        words = self._transcribe_buffer()
+        agreed = 0
+        for previous, current in zip(self.hypothesis, words):
+            if _normalize(previous[2]) != _normalize(current[2]):
+                break
+            agreed += 1
+
+        if agreed == 0 and len(self.buffer) > self.max_buffer_samples and len(words) > 1:
+            # No agreement for too long; force out all but the last word so the
+            # buffer cannot grow without bound.
+            agreed = len(words) - 1
+
+        self.hypothesis = words[agreed:]
+        committed = self._commit(words[:agreed])
+        self._trim()
+        return committed
+
+    def _commit(self, words: List[Word]) -> List[Word]:
+        self.committed.extend(words)
+        return words
+
+    def _trim(self):
+        cut = 0
+        if self.committed:
+            cut = max(0, int((self.committed[-1][1] - self.buffer_offset) * SAMPLE_RATE))
+        # Silence or music commits nothing, so the buffer is also capped on its
+        # own; the oldest audio past the cap is dropped untranscribed.
+        cut = min(max(cut, len(self.buffer) - self.max_buffer_samples), len(self.buffer))
+        if cut <= 0:
+            return
+        self.buffer = self.buffer[cut:]
+        self.buffer_offset += cut / SAMPLE_RATE
+        self.hypothesis = [word for word in self.hypothesis if word[1] > self.buffer_offset]
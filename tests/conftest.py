@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Caches, the job database, checkpoints and the search index all live under
+# this directory; tests must not touch the user's.
+os.environ["TRANSCRIPT_CACHE_DIR"] = tempfile.mkdtemp(prefix="whisper_transcriber_tests_")
@@ -0,0 +1,30 @@
+from transcriber import timestamp_segments
+
+TS = 50000
+WORDS = {1: " hello", 2: " there", 3: " again"}
+
+
+def decode(tokens):
+    return "".join(WORDS[token] for token in tokens)
+
+
+def ts(seconds):
+    return TS + round(seconds / 0.02)
+
+
+def test_pairs_of_timestamps_become_segments():
+    tokens = [ts(0.0), 1, 2, ts(1.5), ts(1.5), 3, ts(2.8)]
+    assert timestamp_segments(tokens, TS, decode, 3.0) == [
+        {'start': 0.0, 'end': 1.5, 'text': " hello there"},
+        {'start': 1.5, 'end': 2.8, 'text': " again"},
+    ]
+
+
+def test_unclosed_text_runs_to_the_end_of_the_clip():
+    tokens = [ts(0.4), 1, ts(1.0), ts(2.0), 3]
+    segments = timestamp_segments(tokens, TS, decode, 4.2)
+    assert segments[-1] == {'start': 2.0, 'end': 4.2, 'text': " again"}
+
+
+def test_timestamps_are_clamped_to_the_clip():
+    assert timestamp_segments([ts(0.0), 1, ts(29.0)], TS, decode, 5.0)[0]['end'] == 5.0
@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import discord_delivery
+from discord_delivery import DeliveryError, DiscordDelivery
+
+
+class StubWebhook:
+    # Replies with the scripted (status, body, headers) responses in order,
+    # then 204, and records every message it receives.
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.received = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.received.append((time.monotonic(), payload["content"]))
+                status, body, headers = stub.responses.pop(0) if stub.responses else (204, None, {})
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if data:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/webhook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def contents(self):
+        return [content for _, content in self.received]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    monkeypatch.setattr(discord_delivery, "DISCORD_MAX_BACKOFF", 0.01)
+    stubs = []
+
+    def start(responses=()):
+        stubs.append(StubWebhook(responses))
+        return stubs[-1]
+
+    yield start
+    for stub in stubs:
+        stub.close()
+
+
+def test_retries_rate_limit_then_server_error_in_order(webhook):
+    stub = webhook([
+        (429, {"message": "You are being rate limited.", "retry_after": 0.3, "global": False}, {}),
+        (502, None, {}),
+        (204, None, {}),
+    ])
+    transcript = "\n\n".join(f"Paragraph {i}. " + "word " * 150 for i in range(6))
+
+    sent = DiscordDelivery(stub.url).send(transcript)
+
+    contents = stub.contents()
+    assert sent == len(contents) - 2 > 1
+    # The first part is retried twice and delivered before any later part.
+    assert contents[0] == contents[1] == contents[2]
+    assert [content.split(":**")[0] for content in contents[2:]] == [f"**Part {i}/{sent}" for i in range(1, sent + 1)]
+    times = [at for at, _ in stub.received]
+    assert times[1] - times[0] >= 0.3
+
+
+def test_waits_for_exhausted_bucket(webhook):
+    stub = webhook([(204, None, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.25"})])
+    delivery = DiscordDelivery(stub.url)
+
+    delivery.post("first")
+    delivery.post("second")
+
+    assert stub.contents() == ["first", "second"]
+    assert stub.received[1][0] - stub.received[0][0] >= 0.25
+
+
+def test_client_error_reports_parts_sent(webhook):
+    stub = webhook([(204, None, {}), (400, {"message": "Invalid Form Body"}, {})])
+    transcript = "\n\n".join(f"Paragraph {i}. " + "word " * 150 for i in range(6))
+
+    with pytest.raises(DeliveryError) as error:
+        DiscordDelivery(stub.url).send(transcript)
+
+    assert error.value.sent == 1
+    assert error.value.total > 1
+    assert len(stub.received) == 2
+
+
+def test_gives_up_after_max_retries(webhook):
+    stub = webhook([(503, None, {})] * 3)
+
+    with pytest.raises(DeliveryError, match="giving up after 3 attempts"):
+        DiscordDelivery(stub.url, max_retries=2).post("hello")
+
+    assert stub.contents() == ["hello"] * 3
@@ -0,0 +1,142 @@
+import itertools
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import job_queue
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue
+from long_form import ChunkCheckpoint
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing timestamps, so created_at ordering is deterministic.
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(job_queue, "time", SimpleNamespace(time=lambda: float(next(ticks)), sleep=lambda s: None))
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "spool"))
+
+
+def submit(queue, key, duration=5.0, language="en", options=None):
+    return queue.submit(b"RIFF" + key.encode(), f"{key}.wav", key, language, None, options, duration)
+
+
+def test_same_key_is_one_job(queue):
+    first = submit(queue, "a")
+    assert submit(queue, "a") == first
+    assert len(os.listdir(queue.spool_dir)) == 1
+    assert queue.get([first])[first]['status'] == QUEUED
+
+
+def test_submit_path_discards_the_file_of_a_duplicate(queue, tmp_path):
+    job_id = submit(queue, "a")
+    duplicate = tmp_path / "spool" / "upload.part.wav"
+    duplicate.write_bytes(b"RIFF")
+    assert queue.submit_path(str(duplicate), "a.wav", "a", "en") == job_id
+    assert not duplicate.exists()
+
+
+def test_claim_batch_groups_short_clips_with_matching_settings(queue):
+    long_job = submit(queue, "long", duration=900.0)
+    short = [submit(queue, f"short{i}") for i in range(3)]
+    other_language = submit(queue, "fr", language="fr")
+    other_options = submit(queue, "beam", options={'beam_size': 5})
+
+    assert [job['id'] for job in queue.claim_batch(8)] == [long_job]
+    assert [job['id'] for job in queue.claim_batch(8)] == short
+    assert [job['id'] for job in queue.claim_batch(8)] == [other_language]
+    assert [job['id'] for job in queue.claim_batch(8)] == [other_options]
+    assert queue.claim_batch(8) == []
+
+
+def test_short_lane_skips_long_jobs(queue):
+    submit(queue, "long", duration=900.0)
+    short = submit(queue, "short", duration=10.0)
+    claimed = queue.claim_batch(1, max_duration=60)
+    assert [job['id'] for job in claimed] == [short]
+    assert claimed[0]['status'] == RUNNING
+
+
+def test_concurrent_claims_never_share_a_job(queue):
+    ids = {submit(queue, f"job{i}", duration=900.0) for i in range(40)}
+    claimed = []
+    lock = threading.Lock()
+
+    def claim_all():
+        while True:
+            jobs = queue.claim_batch(1)
+            if not jobs:
+                return
+            with lock:
+                claimed.extend(job['id'] for job in jobs)
+
+    threads = [threading.Thread(target=claim_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_retry_requeues_until_attempts_run_out(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 3)
+    job_id = submit(queue, "crashy")
+    assert queue.retry(job_id, "worker crashed")
+    assert queue.retry(job_id, "worker crashed")
+    assert not queue.retry(job_id, "worker crashed")
+    assert queue.get([job_id])[job_id]['status'] == FAILED
+
+    # An upload of the same audio starts over with a fresh attempt budget.
+    assert submit(queue, "crashy") == job_id
+    assert queue.retry(job_id, "worker crashed")
+    assert queue.get([job_id])[job_id]['status'] == QUEUED
+
+
+def test_final_failure_removes_payload_and_checkpoints(queue):
+    job_id = submit(queue, "broken")
+    payload = queue.get([job_id])[job_id]['payload_path']
+    checkpoint = ChunkCheckpoint("broken")
+    checkpoint.save(0, {'text': "partial", 'segments': []})
+
+    queue.fail(job_id, "decode error")
+    assert not os.path.exists(payload)
+    assert checkpoint.load() == {}
+
+
+def test_complete_stores_the_result_and_frees_the_spool(queue):
+    job_id = submit(queue, "done")
+    payload = queue.get([job_id])[job_id]['payload_path']
+    queue.complete(job_id, {'text': " hi", 'segments': []})
+    job = queue.get([job_id])[job_id]
+    assert job['status'] == DONE and job['result']['text'] == " hi"
+    assert not os.path.exists(payload)
+
+
+def test_prune_drops_only_old_finished_rows(queue):
+    finished = submit(queue, "old")
+    queue.complete(finished, {'text': "", 'segments': []})
+    waiting = submit(queue, "waiting")
+    queue._connect().execute("UPDATE jobs SET updated_at = 0")
+    assert queue.prune() == 1
+    assert list(queue.get([finished, waiting])) == [waiting]
+
+
+def test_find_follows_the_callers_preference_and_skips_failures(queue):
+    small = submit(queue, "small")
+    submit(queue, "base")
+    assert queue.find(["medium", "small", "base"]) == "small"
+    queue.fail(small, "boom")
+    assert queue.find(["medium", "small", "base"]) == "base"
+    assert queue.find([]) is None
+
+
+def test_spooled_bytes_counts_waiting_jobs_only(queue):
+    waiting = submit(queue, "waiting")
+    finished = submit(queue, "finished")
+    queue.complete(finished, {'text': "", 'segments': []})
+    assert queue.spooled_bytes([waiting, finished]) == len(b"RIFFwaiting")
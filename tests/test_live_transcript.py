@@ -0,0 +1,44 @@
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from streaming import StreamingTranscriber, words_to_segment
+from transcript_store import TranscriptStore
+
+WORDS = [(0.5, 0.9, " hello"), (1.0, 1.4, " there"), (1.6, 2.0, " general"), (2.2, 2.8, " kenobi")]
+
+
+class ScriptedTranscriber:
+    # Returns the fixed word list, clipped to the audio currently buffered.
+    def __init__(self, streamer_ref):
+        self.streamer_ref = streamer_ref
+
+    def transcribe(self, audio, language, **options):
+        offset = self.streamer_ref[0].buffer_offset
+        end = offset + len(audio) / SAMPLE_RATE
+        words = [{'start': s - offset, 'end': e - offset, 'word': w} for s, e, w in WORDS if e <= end and s >= offset]
+        return {'segments': [{'words': words}]}
+
+
+def test_live_cues_keep_word_timestamps():
+    ref = []
+    streamer = StreamingTranscriber(ScriptedTranscriber(ref), "en", chunk_seconds=1.0)
+    ref.append(streamer)
+
+    store = TranscriptStore()
+    store.append([{'start': 0.0, 'end': 4.0, 'text': "earlier recording"}], "Recording", duration=5.0)
+    live_offset = store.offset
+
+    batches = [streamer.feed(np.zeros(SAMPLE_RATE, dtype=np.float32)) for _ in range(3)]
+    batches.append(streamer.finish())
+    for words in batches:
+        if words:
+            store.append([words_to_segment(words)], "Live", new_paragraph=False, offset=live_offset)
+
+    live = [store.segment(i) for i in range(1, len(store))]
+    assert " ".join(segment['text'] for segment in live) == "hello there general kenobi"
+    assert live[0]['start'] == 5.5
+    assert live[-1]['end'] == 7.8
+    for segment in live:
+        assert segment['end'] > segment['start']
+    assert [segment['start'] for segment in live] == sorted(segment['start'] for segment in live)
+    assert "00:00:05,500 --> " in store.to_srt()
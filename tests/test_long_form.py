@@ -0,0 +1,81 @@
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from long_form import LongFormJob, plan_chunks, stitch
+
+
+def speech(seconds, quiet_at=()):
+    # Loud noise with silent gaps where the planner should cut.
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    for at in quiet_at:
+        audio[int((at - 0.5) * SAMPLE_RATE):int((at + 0.5) * SAMPLE_RATE)] = 0.0
+    return audio
+
+
+def test_owned_ranges_tile_the_audio():
+    audio = speech(100)
+    plans = plan_chunks(audio, chunk_seconds=30, overlap_seconds=2)
+    assert plans[0][2] == 0 and plans[-1][3] == len(audio)
+    for (_, _, _, owned_end), (_, _, next_start, _) in zip(plans, plans[1:]):
+        assert owned_end == next_start
+    for start, end, owned_start, owned_end in plans:
+        assert start == max(0, owned_start - 2 * SAMPLE_RATE)
+        assert end == min(len(audio), owned_end + 2 * SAMPLE_RATE)
+
+
+def test_cuts_land_in_silence():
+    plans = plan_chunks(speech(70, quiet_at=[35]), chunk_seconds=30, overlap_seconds=2)
+    assert len(plans) == 2
+    assert abs(plans[0][3] / SAMPLE_RATE - 35) < 0.5
+
+
+def test_short_audio_is_one_chunk():
+    audio = speech(40)
+    assert plan_chunks(audio, chunk_seconds=30, overlap_seconds=2) == [(0, len(audio), 0, len(audio))]
+
+
+def test_overlap_segments_are_kept_once():
+    plans = [(0, 12 * SAMPLE_RATE, 0, 10 * SAMPLE_RATE), (8 * SAMPLE_RATE, 20 * SAMPLE_RATE, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE)]
+    results = {
+        0: {'language': "en", 'segments': [
+            {'start': 0.0, 'end': 5.0, 'text': " one two"},
+            {'start': 9.0, 'end': 11.5, 'text': " three"},
+        ]},
+        1: {'language': "en", 'segments': [
+            {'start': 1.0, 'end': 3.5, 'text': " three"},
+            {'start': 4.0, 'end': 8.0, 'text': " four"},
+        ]},
+    }
+    # Both chunks hear " three"; its midpoint is past 10 s, so chunk 1's copy wins.
+    stitched = stitch(plans, results)
+    assert stitched['text'] == " one two three four"
+    assert [(seg['start'], seg['end']) for seg in stitched['segments']] == [(0.0, 5.0), (9.0, 11.5), (12.0, 16.0)]
+    assert stitched['language'] == "en" and stitched['chunks'] == 2
+
+
+def test_word_cut_at_the_boundary_is_not_repeated():
+    plans = [(0, 12 * SAMPLE_RATE, 0, 10 * SAMPLE_RATE), (8 * SAMPLE_RATE, 20 * SAMPLE_RATE, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE)]
+    results = {
+        0: {'segments': [{'start': 6.0, 'end': 9.9, 'text': " the quick brown"}]},
+        1: {'segments': [{'start': 2.0, 'end': 6.0, 'text': " Brown fox jumps."}]},
+    }
+    assert stitch(plans, results)['text'] == " the quick brown fox jumps."
+
+
+def test_missing_chunks_are_skipped():
+    plans = [(0, 10 * SAMPLE_RATE, 0, 10 * SAMPLE_RATE), (10 * SAMPLE_RATE, 20 * SAMPLE_RATE, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE)]
+    stitched = stitch(plans, {1: {'language': "de", 'segments': [{'start': 1.0, 'end': 2.0, 'text': " hallo"}]}})
+    assert stitched['segments'] == [{'start': 11.0, 'end': 12.0, 'text': " hallo"}]
+    assert stitched['language'] == "de"
+
+
+def test_checkpointed_chunks_are_not_redone():
+    audio = np.zeros(700 * SAMPLE_RATE, dtype=np.float32)
+    job = LongFormJob(audio, "resume-test")
+    first = job.pending()[0]
+    job.add_result(first, {'segments': [], 'text': ""})
+
+    resumed = LongFormJob(audio, "resume-test")
+    assert first not in resumed.pending()
+    assert len(resumed.pending()) == resumed.total - 1
+    resumed.checkpoint.clear()
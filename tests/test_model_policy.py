@@ -0,0 +1,30 @@
+import pytest
+
+from model_policy import MODEL_LOAD_SECONDS, MODEL_RTF, choose, models_at_least
+
+MB = 1024 * 1024
+LADDER = ["tiny", "base", "small", "medium"]
+
+
+def test_unloaded_models_pay_their_load_time():
+    warm = choose(5, ladder=LADDER, loaded=set(LADDER), free_bytes=4096 * MB)
+    cold = choose(5, ladder=LADDER, loaded={"base"}, free_bytes=3800 * MB)
+    assert warm.model_name == cold.model_name == "medium"
+    assert cold.estimated_seconds - warm.estimated_seconds == pytest.approx(MODEL_LOAD_SECONDS["medium"])
+
+
+def test_load_time_can_rule_a_model_out():
+    duration = 30
+    budget = duration * MODEL_RTF["medium"] + 1
+    assert choose(duration, budget=budget, ladder=LADDER).model_name == "medium"
+    assert choose(duration, budget=budget, ladder=LADDER, loaded={"base"}, free_bytes=3800 * MB).model_name == "small"
+
+
+def test_models_that_would_evict_a_loaded_one_are_skipped():
+    decision = choose(5, ladder=LADDER, loaded={"base", "small"}, free_bytes=(4096 - 1260) * MB)
+    assert decision.model_name == "small"
+
+
+def test_models_at_least_is_largest_first():
+    assert models_at_least("base", LADDER) == ["medium", "small", "base"]
+    assert models_at_least("large-v3", LADDER) == ["large-v3"]
@@ -0,0 +1,70 @@
+import pytest
+
+from search_index import SearchIndex, fts_query
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite3"))
+    if not index.enabled:
+        pytest.skip("SQLite built without FTS5")
+    return index
+
+
+def result(*texts, language="en"):
+    return {'language': language, 'segments': [
+        {'start': float(i), 'end': float(i + 1), 'text': text} for i, text in enumerate(texts)
+    ]}
+
+
+def test_fts_syntax_is_searched_literally():
+    assert fts_query("state-of-the-art") == '"state-of-the-art"'
+    assert fts_query("foo AND bar") == '"foo" "AND" "bar"'
+    assert fts_query('say "hello world"') == '"say" "hello world"'
+    assert fts_query('a"b') == '"a""b"'
+    assert fts_query("-- ()") == ""
+
+
+def test_only_an_explicit_star_is_a_prefix():
+    assert fts_query("transcri*") == '"transcri"*'
+    assert fts_query("transcri") == '"transcri"'
+    assert fts_query("*") == ""
+    assert fts_query('"exact*"') == '"exact*"'
+
+
+def test_search_finds_segments_with_their_times(index):
+    index.add("k1", "meeting.wav", result(" Budget review.", " The quarterly budget is approved."), "small", 2.0)
+    index.add("k2", "call.mp3", result(" Nothing about money here."), "base", 1.0)
+
+    hits = index.search("budget")
+    assert {(hit.source, hit.start) for hit in hits} == {("meeting.wav", 0.0), ("meeting.wav", 1.0)}
+    assert all("**" in hit.snippet for hit in hits)
+    assert hits[0].model == "small" and hits[0].language == "en"
+    assert [hit.source for hit in index.search("mon*")] == ["call.mp3"]
+    assert index.search("mon") == []
+
+
+def test_accents_and_case_are_ignored(index):
+    index.add("k1", "fr.wav", result(" Le Café est fermé.", language="fr"))
+    assert len(index.search("cafe ferme")) == 1
+
+
+def test_same_key_is_indexed_once(index):
+    assert index.add("k1", "a.wav", result(" hello")) is not None
+    assert index.add("k1", "a copy.wav", result(" hello")) is None
+    assert len(index.search("hello")) == 1
+    assert index.stats()['transcripts'] == 1
+
+
+def test_text_without_segments_is_indexed_whole(index):
+    index.add("k1", "a.wav", {'text': " plain text result", 'segments': []}, duration=4.0)
+    [hit] = index.search("plain")
+    assert (hit.start, hit.end) == (0.0, 4.0)
+    assert index.add("k2", "empty.wav", {'text': " ", 'segments': []}) is None
+
+
+def test_malformed_input_returns_nothing(index):
+    index.add("k1", "a.wav", result(" hello"))
+    assert index.search("") == []
+    assert index.search('"') == []
+    assert index.search("NEAR(") == []
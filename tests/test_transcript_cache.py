@@ -0,0 +1,60 @@
+import itertools
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import transcript_cache
+from transcript_cache import TranscriptCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    ticks = itertools.count(1)
+    monkeypatch.setattr(transcript_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+    return TranscriptCache(str(tmp_path))
+
+
+def transcript(seed):
+    # Random hex barely compresses, so every entry has about the same size.
+    return {'text': os.urandom(2048).hex() + seed, 'segments': []}
+
+
+def fit(cache, entries):
+    size = cache._connect().execute("SELECT MAX(size) FROM transcripts").fetchone()[0]
+    # Half an entry of slack absorbs small differences in compressed size.
+    cache.max_bytes = size * entries + size // 2
+
+
+def test_round_trip(cache):
+    value = {'text': " héllo", 'segments': [{'start': 0.0, 'end': 1.0, 'text': " héllo"}]}
+    cache.put("k", value)
+    assert cache.get("k") == value
+    assert cache.get("missing") is None
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.put("a", transcript("a"))
+    fit(cache, 2)
+    cache.put("b", transcript("b"))
+    assert cache.get("a") is not None
+    cache.put("c", transcript("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_eviction_frees_just_enough(cache):
+    for key in "abcd":
+        cache.put(key, transcript(key))
+    fit(cache, 3)
+    cache.put("e", transcript("e"))
+    assert [key for key in "abcde" if cache.get(key) is not None] == ["c", "d", "e"]
+    assert cache.stats()['entries'] == 3
+
+
+def test_replacing_a_key_does_not_double_count(cache):
+    cache.put("a", transcript("a"))
+    fit(cache, 1)
+    cache.put("a", transcript("a"))
+    assert cache.get("a") is not None
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from audio_io import SAMPLE_RATE
+from vad import detect_speech, trim_silence
+
+
+def harmonic(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = sum(np.sin(2 * np.pi * f * t) / (k + 1) for k, f in enumerate((180, 360, 540, 720)))
+    return (amplitude * tone / np.abs(tone).max()).astype(np.float32)
+
+
+@pytest.mark.parametrize("noise", [0.0, 0.01, 0.05])
+def test_continuous_speech_is_kept(noise):
+    rng = np.random.default_rng(0)
+    audio = harmonic(8.0) + noise * rng.standard_normal(8 * SAMPLE_RATE).astype(np.float32)
+    assert detect_speech(audio) == [(0, len(audio))]
+    speech, timeline = trim_silence(audio)
+    assert len(speech) == len(audio)
+
+
+@pytest.mark.parametrize("noise", [0.0, 1e-4])
+def test_silence_is_dropped(noise):
+    rng = np.random.default_rng(0)
+    audio = (noise * rng.standard_normal(5 * SAMPLE_RATE)).astype(np.float32)
+    assert detect_speech(audio) == []
+
+
+def test_pauses_are_trimmed():
+    silence = np.zeros(3 * SAMPLE_RATE, dtype=np.float32)
+    audio = np.concatenate([silence, harmonic(2.0), silence])
+    spans = detect_speech(audio)
+    assert len(spans) == 1
+    start, end = spans[0]
+    assert 2.5 * SAMPLE_RATE < start <= 3 * SAMPLE_RATE
+    assert 5 * SAMPLE_RATE <= end < 5.5 * SAMPLE_RATE
@@ -0,0 +1,243 @@
+import contextlib
+import importlib
+import logging
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE, PcmFile, decode_file
+from language_id import resolve_language
+from long_form import Audio, LongFormJob, is_long_form, transcribe_long
+from metrics import annotate, stage, timed_call
+from model_registry import DEFAULT_PRECISION, ModelEntry, get_registry
+from vad import VAD_ENABLED, remap_result, trim_silence
+
+SUPPORTED_FORMATS = ['.mp3', '.m4a', '.wav', '.ogg', '.mp4', '.mov', '.mkv', '.webm']
+MODEL_NAME = "base"
+DECODE_OPTIONS = {'task': "transcribe", 'vad': VAD_ENABLED}
+if DEFAULT_PRECISION:
+    # int8 output can differ slightly from fp32, so it must not share cache entries.
+    DECODE_OPTIONS['precision'] = DEFAULT_PRECISION
+
+BATCH_MAX_CLIPS = int(os.environ.get("TRANSCRIBE_BATCH_SIZE", "8"))
+BATCH_MAX_SECONDS = 30.0
+# The thresholds whisper.transcribe uses to reject a decode and retry it at a
+# higher temperature, or to treat a window as silence.
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+logger = logging.getLogger(__name__)
+
+_whisper_instrumented = False
+_instrument_lock = threading.Lock()
+
+
+def instrument_whisper():
+    # whisper.transcribe computes the log-mel spectrogram internally; wrapping
+    # the name it imported is the only way to time it apart from inference.
+    global _whisper_instrumented
+    with _instrument_lock:
+        if _whisper_instrumented:
+            return
+        module = importlib.import_module("whisper.transcribe")
+        module.log_mel_spectrogram = timed_call("log_mel", module.log_mel_spectrogram)
+        _whisper_instrumented = True
+
+
+def inference_mode(model):
+    # A real model means torch is already imported; anything else (the
+    # benchmark's stub) runs without torch, which need not be installed.
+    torch = sys.modules.get("torch")
+    if torch is None or not isinstance(model, torch.nn.Module):
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
+def compact_segments(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {'start': round(float(seg['start']), 3), 'end': round(float(seg['end']), 3), 'text': seg['text']}
+        for seg in result.get('segments', [])
+    ]
+
+
+def timestamp_segments(tokens: List[int], timestamp_begin: int, decode: Callable[[List[int]], str],
+                       duration: float) -> List[Dict[str, Any]]:
+    # Splits a timestamped decode the way whisper.transcribe does: text sits
+    # between a pair of timestamp tokens, 0.02 s apart.
+    segments = []
+    start: Optional[float] = None
+    text_tokens: List[int] = []
+    for token in tokens:
+        if token < timestamp_begin:
+            text_tokens.append(token)
+            continue
+        time = min(round((token - timestamp_begin) * 0.02, 2), duration)
+        if start is not None and text_tokens:
+            segments.append({'start': start, 'end': time, 'text': decode(text_tokens)})
+            start, text_tokens = None, []
+        else:
+            start = time
+    if text_tokens:
+        segments.append({'start': start or 0.0, 'end': duration, 'text': decode(text_tokens)})
+    return [segment for segment in segments if segment['text'].strip()]
+
+
+def summarize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {'text': result['text'], 'segments': compact_segments(result), 'language': result.get('language')}
+    if 'vad' in result:
+        summary['vad'] = result['vad']
+    return summary
+
+
+class AudioTranscriber:
+    def __init__(self, model_name: str = MODEL_NAME, device: Optional[str] = None, precision: Optional[str] = None):
+        instrument_whisper()
+        self.entry = get_registry().get(model_name, device, precision)
+        self.model_name, self.device, self.precision = self.entry.key
+        self.model = self.entry.model
+
+    @classmethod
+    def with_model(cls, model, model_name: str = "custom", device: str = "cpu", precision: str = "fp32") -> "AudioTranscriber":
+        transcriber = cls.__new__(cls)
+        transcriber.entry = ModelEntry(key=(model_name, device, precision), model=model, nbytes=0)
+        transcriber.model_name, transcriber.device, transcriber.precision = transcriber.entry.key
+        transcriber.model = model
+        return transcriber
+
+    def transcribe(self, audio, language: Optional[str] = "en", vad: Optional[bool] = None, **options) -> Dict[str, Any]:
+        if vad is None:
+            vad = DECODE_OPTIONS['vad']
+        if isinstance(audio, str):
+            audio = decode_file(audio)
+        if vad and isinstance(audio, np.ndarray):
+            speech, timeline = trim_silence(audio)
+            logger.info("VAD kept %(speech_seconds)ss of %(total_seconds)ss audio", timeline.stats())
+            if len(speech) == 0:
+                return {'text': "", 'segments': [], 'language': language, 'vad': timeline.stats()}
+            return remap_result(self._transcribe(speech, language, **options), timeline)
+        return self._transcribe(audio, language, **options)
+
+    def _transcribe(self, audio, language: Optional[str], **options) -> Dict[str, Any]:
+        with self.entry.lock, stage("inference"), inference_mode(self.model):
+            return self.model.transcribe(
+                audio,
+                verbose=False,
+                task=DECODE_OPTIONS['task'],
+                language=language,
+                fp16=self.precision == "fp16",
+                **options
+            )
+
+    def transcribe_resumable(self, audio: Audio, language: Optional[str] = "en", checkpoint_key: Optional[str] = None,
+                             on_chunk: Optional[Callable[[LongFormJob], None]] = None, **options) -> Dict[str, Any]:
+        annotate(audio_seconds=round(len(audio) / SAMPLE_RATE, 3), model=self.model_name)
+        # Detected once for the whole file, so long-form chunks cannot disagree.
+        language = resolve_language(self, audio, language)
+        if checkpoint_key and is_long_form(audio):
+            return transcribe_long(
+                lambda chunk: summarize_result(self.transcribe(chunk, language, **options)),
+                audio,
+                checkpoint_key,
+                on_chunk
+            )
+        if isinstance(audio, PcmFile):
+            audio = audio[:]
+        return summarize_result(self.transcribe(audio, language, **options))
+
+    def transcribe_batch(self, clips: List[np.ndarray], language: Optional[str] = "en", vad: Optional[bool] = None,
+                         **options) -> List[Dict[str, Any]]:
+        if vad is None:
+            vad = DECODE_OPTIONS['vad']
+        results: List[Optional[Dict[str, Any]]] = [None] * len(clips)
+        batch = []
+        for i, audio in enumerate(clips):
+            timeline = None
+            if vad:
+                audio, timeline = trim_silence(audio)
+                if len(audio) == 0:
+                    results[i] = {'text': "", 'segments': [], 'language': language, 'vad': timeline.stats()}
+                    continue
+            if len(audio) > BATCH_MAX_SECONDS * SAMPLE_RATE:
+                result = self._transcribe(audio, language, **options)
+                results[i] = remap_result(result, timeline) if timeline else result
+            else:
+                batch.append((i, audio, timeline))
+
+        for start in range(0, len(batch), BATCH_MAX_CLIPS):
+            group = batch[start:start + BATCH_MAX_CLIPS]
+            decoded = self._decode_batch([audio for _, audio, _ in group], language, **options)
+            for (i, audio, timeline), result in zip(group, decoded):
+                if result is None:
+                    # Rejected at temperature 0: let whisper.transcribe run its fallback.
+                    result = self._transcribe(audio, language, **options)
+                results[i] = remap_result(result, timeline) if timeline else result
+        return [summarize_result(result) for result in results]
+
+    def transcribe_batch_files(self, paths: List[str], language: Optional[str] = "en",
+                               **options) -> List[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+        clips, outcomes = [], []
+        for path in paths:
+            # Any failure, a missing ffmpeg binary or an unreadable file
+            # included, is reported for that file and the batch carries on.
+            try:
+                clips.append(decode_file(path))
+                outcomes.append(None)
+            except Exception as e:
+                outcomes.append((None, str(e)))
+        results = iter(self.transcribe_batch(clips, language, **options))
+        return [outcome or (next(results), None) for outcome in outcomes]
+
+    def _decode_batch(self, clips: List[np.ndarray], language: Optional[str], **options) -> List[Optional[Dict[str, Any]]]:
+        # Every clip is still padded to whisper's 30 s window, but one encoder
+        # and decoder pass over the stacked batch replaces len(clips) passes.
+        import torch
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+        with stage("log_mel"):
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels) for audio in clips
+            ]).to(self.model.device)
+        if self.precision == "fp16":
+            mel = mel.half()
+
+        temperature = options.get('temperature', 0.0)
+        fallback = 'temperature' not in options or (isinstance(temperature, (list, tuple)) and len(temperature) > 1)
+        if isinstance(temperature, (list, tuple)):
+            temperature = temperature[0]
+        decode_options = whisper.DecodingOptions(
+            task=DECODE_OPTIONS['task'],
+            language=language,
+            temperature=temperature,
+            beam_size=options.get('beam_size'),
+            fp16=self.precision == "fp16",
+        )
+        with self.entry.lock, stage("inference"), torch.inference_mode():
+            decoded = whisper.decode(self.model, mel, decode_options)
+
+        results = []
+        for audio, result in zip(clips, decoded):
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                results.append({'text': "", 'segments': [], 'language': result.language})
+            elif fallback and (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                               or result.avg_logprob < LOGPROB_THRESHOLD):
+                results.append(None)
+            else:
+                # Timed like whisper.transcribe's segments, so a batched clip
+                # can share cache entries with one transcribed on its own.
+                tokenizer = get_tokenizer(
+                    self.model.is_multilingual, num_languages=self.model.num_languages,
+                    language=result.language, task=DECODE_OPTIONS['task']
+                )
+                segments = timestamp_segments(
+                    result.tokens, tokenizer.timestamp_begin, tokenizer.decode, round(len(audio) / SAMPLE_RATE, 3)
+                )
+                results.append({
+                    'text': "".join(segment['text'] for segment in segments),
+                    'segments': segments,
+                    'language': result.language
+                })
+        return results
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from metrics import annotate, increment, stage
+
+CACHE_DIR = os.environ.get(
+    "TRANSCRIPT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "whisper_transcriber")
+)
+CACHE_MAX_MB = int(os.environ.get("TRANSCRIPT_CACHE_MB", "512"))
+
+
+def audio_hash(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(audio_sha256: str, model_name: str, language: Optional[str], options: Optional[Dict[str, Any]] = None) -> str:
+    spec = json.dumps(
+        {'audio': audio_sha256, 'model': model_name, 'language': language, 'options': options or {}},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    def __init__(self, directory: str = CACHE_DIR, max_mb: int = CACHE_MAX_MB):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "transcripts.sqlite3")
+        self.max_bytes = max_mb * 1024 * 1024
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "key TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS transcripts_lru ON transcripts (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # One connection per thread; WAL lets Streamlit sessions and pool
+            # workers read while another one writes.
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with stage("cache_lookup"):
+            return self._get(key)
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute("SELECT payload FROM transcripts WHERE key = ?", (key,)).fetchone()
+        result = "miss" if row is None else "hit"
+        increment("whisper_transcript_cache_requests_total", result=result)
+        annotate(transcript_cache=result)
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE transcripts SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, value: Dict[str, Any]):
+        payload = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcripts (key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        for key, size in conn.execute("SELECT key, size FROM transcripts ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM transcripts")
+
+    def stats(self) -> Dict[str, Any]:
+        count, total = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts"
+        ).fetchone()
+        return {'entries': count, 'size_mb': round(total / (1024 * 1024), 2), 'max_mb': self.max_bytes // (1024 * 1024)}
+
+
+_cache: Optional[TranscriptCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TranscriptCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscriptCache()
+        return _cache
@@ -0,0 +1,131 @@
+import json
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EXPORT_FORMATS = {
+    'txt': ("transcript.txt", "text/plain"),
+    'srt': ("transcript.srt", "application/x-subrip"),
+    'vtt': ("transcript.vtt", "text/vtt"),
+    'json': ("transcript.json", "application/json"),
+}
+PAGE_SIZE = 50
+
+
+def format_timestamp(seconds: float, separator: str = ".") -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+class TranscriptStore:
+    # Segments are kept column-wise in typed arrays rather than as a list of
+    # dicts, so a multi-hour session costs a few bytes per segment plus its text.
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.source_ids = array('H')
+        self.paragraph_starts = array('b')
+        self.texts: List[str] = []
+        self.sources: List[str] = []
+        self._source_index: Dict[str, int] = {}
+        self.offset = 0.0
+        self.version = 0
+        self._exports: Dict[str, str] = {}
+        self._exports_version = -1
+
+    def nbytes(self) -> int:
+        arrays = (self.starts, self.ends, self.source_ids, self.paragraph_starts)
+        exports = sum(len(text) for text in self._exports.values())
+        return sum(a.itemsize * len(a) for a in arrays) + sum(len(text) for text in self.texts) + exports
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _source_id(self, source: str) -> int:
+        if source not in self._source_index:
+            self._source_index[source] = len(self.sources)
+            self.sources.append(source)
+        return self._source_index[source]
+
+    def append(self, segments: Iterable[Dict[str, Any]], source: str, duration: float = 0.0,
+               new_paragraph: bool = True, offset: Optional[float] = None) -> int:
+        # A live stream passes the offset it started at, since its segment
+        # times are relative to that point rather than to the last append.
+        if offset is None:
+            offset = self.offset
+        source_id = self._source_id(source)
+        added = 0
+        end = 0.0
+        for segment in segments:
+            text = segment['text'].strip()
+            if not text:
+                continue
+            self.starts.append(offset + segment['start'])
+            self.ends.append(offset + segment['end'])
+            self.source_ids.append(source_id)
+            self.paragraph_starts.append(1 if new_paragraph and added == 0 else 0)
+            self.texts.append(text)
+            end = max(end, segment['end'])
+            added += 1
+        # Later recordings continue on the session timeline after this one.
+        self.offset = max(self.offset, offset + max(duration, end))
+        if added:
+            self.version += 1
+        return added
+
+    def segment(self, index: int) -> Dict[str, Any]:
+        return {
+            'start': round(self.starts[index], 3),
+            'end': round(self.ends[index], 3),
+            'text': self.texts[index],
+            'source': self.sources[self.source_ids[index]],
+        }
+
+    def page_count(self, page_size: int = PAGE_SIZE) -> int:
+        return max(1, -(-len(self) // page_size))
+
+    def page(self, number: int, page_size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+        start = number * page_size
+        return [self.segment(i) for i in range(start, min(start + page_size, len(self)))]
+
+    def paragraphs(self) -> Iterable[Tuple[int, int]]:
+        start = 0
+        for i in range(1, len(self) + 1):
+            if i == len(self) or self.paragraph_starts[i]:
+                yield start, i
+                start = i
+
+    def export(self, fmt: str) -> str:
+        if self._exports_version != self.version:
+            self._exports = {}
+            self._exports_version = self.version
+        if fmt not in self._exports:
+            self._exports[fmt] = getattr(self, f"to_{fmt}")()
+        return self._exports[fmt]
+
+    def text(self) -> str:
+        return self.export('txt')
+
+    def to_txt(self) -> str:
+        return "\n\n".join(" ".join(self.texts[start:end]) for start, end in self.paragraphs())
+
+    def to_srt(self) -> str:
+        cues = []
+        for i in range(len(self)):
+            timing = f"{format_timestamp(self.starts[i], ',')} --> {format_timestamp(self.ends[i], ',')}"
+            cues.append(f"{i + 1}\n{timing}\n{self.texts[i]}\n")
+        return "\n".join(cues)
+
+    def to_vtt(self) -> str:
+        cues = ["WEBVTT\n"]
+        for i in range(len(self)):
+            cues.append(f"{format_timestamp(self.starts[i])} --> {format_timestamp(self.ends[i])}\n{self.texts[i]}\n")
+        return "\n".join(cues)
+
+    def to_json(self) -> str:
+        return json.dumps({'segments': [self.segment(i) for i in range(len(self))]}, ensure_ascii=False, indent=2)
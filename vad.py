@@ -0,0 +1,135 @@
+import bisect
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from metrics import stage
+
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "1") != "0"
+VAD_FRAME_MS = 30
+VAD_MARGIN_DB = 12.0
+VAD_MIN_SPEECH_DB = -55.0
+VAD_MIN_SPEECH_MS = 150
+VAD_MIN_SILENCE_MS = 500
+VAD_PAD_MS = 200
+
+Span = Tuple[int, int]
+
+
+def frame_energies(audio: np.ndarray, frame_samples: int) -> np.ndarray:
+    n_frames = len(audio) // frame_samples
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * frame_samples].reshape(n_frames, frame_samples)
+    return 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+
+def _runs(mask: np.ndarray) -> List[Span]:
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def detect_speech(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Span]:
+    frame_samples = sample_rate * VAD_FRAME_MS // 1000
+    energies = frame_energies(audio, frame_samples)
+    if len(energies) == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    # Adaptive threshold above the estimated noise floor, but never so low that
+    # digital silence or faint hiss counts as speech.
+    noise_floor = float(np.percentile(energies, 10))
+    if float(np.percentile(energies, 90)) < noise_floor + VAD_MARGIN_DB:
+        # No pauses to estimate the floor from: the clip is level throughout,
+        # either continuous speech (or a noisy room) or silence.
+        return [(0, len(audio))] if float(energies.max()) > VAD_MIN_SPEECH_DB else []
+    threshold = max(noise_floor + VAD_MARGIN_DB, VAD_MIN_SPEECH_DB)
+    runs = _runs(energies > threshold)
+
+    min_silence = VAD_MIN_SILENCE_MS // VAD_FRAME_MS
+    min_speech = VAD_MIN_SPEECH_MS // VAD_FRAME_MS
+    pad = VAD_PAD_MS // VAD_FRAME_MS
+
+    merged: List[Span] = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    spans: List[Span] = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start = max(0, start - pad) * frame_samples
+        end = min(len(audio), (end + pad) * frame_samples)
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    if spans and spans[-1][1] >= len(energies) * frame_samples:
+        spans[-1] = (spans[-1][0], len(audio))
+    return spans
+
+
+@dataclass
+class SpeechTimeline:
+    spans: List[Span]
+    total_samples: int
+    sample_rate: int = SAMPLE_RATE
+
+    def __post_init__(self):
+        self.offsets = [0]
+        for start, end in self.spans:
+            self.offsets.append(self.offsets[-1] + end - start)
+
+    @property
+    def speech_samples(self) -> int:
+        return self.offsets[-1]
+
+    def to_original(self, seconds: float, is_end: bool = False) -> float:
+        if not self.spans:
+            return seconds
+        position = seconds * self.sample_rate
+        # An end time that falls exactly on a join belongs to the earlier span.
+        search = bisect.bisect_left if is_end else bisect.bisect_right
+        index = min(max(search(self.offsets, position) - 1, 0), len(self.spans) - 1)
+        original = self.spans[index][0] + position - self.offsets[index]
+        return round(min(original, self.spans[index][1]) / self.sample_rate, 3)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.total_samples / self.sample_rate
+        speech = self.speech_samples / self.sample_rate
+        return {
+            'total_seconds': round(total, 2),
+            'speech_seconds': round(speech, 2),
+            'skipped_seconds': round(total - speech, 2),
+            'skipped_ratio': round((total - speech) / total, 3) if total else 0.0,
+        }
+
+
+def trim_silence(audio: np.ndarray) -> Tuple[np.ndarray, SpeechTimeline]:
+    with stage("vad"):
+        return _trim_silence(audio)
+
+
+def _trim_silence(audio: np.ndarray) -> Tuple[np.ndarray, SpeechTimeline]:
+    spans = detect_speech(audio)
+    timeline = SpeechTimeline(spans, len(audio))
+    if not spans:
+        return np.zeros(0, dtype=np.float32), timeline
+    return np.concatenate([audio[start:end] for start, end in spans]), timeline
+
+
+def remap_result(result: Dict[str, Any], timeline: SpeechTimeline) -> Dict[str, Any]:
+    for segment in result.get('segments', []):
+        segment['start'] = timeline.to_original(segment['start'])
+        segment['end'] = timeline.to_original(segment['end'], is_end=True)
+        for word in segment.get('words', []) or []:
+            word['start'] = timeline.to_original(word['start'])
+            word['end'] = timeline.to_original(word['end'], is_end=True)
+    result['vad'] = timeline.stats()
+    return result
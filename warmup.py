@@ -0,0 +1,88 @@
+import importlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import wait
+from typing import Any, Dict, List, Optional
+
+from metrics import register_route, set_gauge
+from transcriber import MODEL_NAME
+
+WARMUP_MODELS = [name.strip() for name in os.environ.get("WARMUP_MODELS", MODEL_NAME).split(",") if name.strip()]
+
+IDLE = "idle"
+IMPORTING = "importing"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+_state: Dict[str, Any] = {'status': IDLE, 'started_at': None, 'ready_at': None, 'error': None}
+_state_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def _set_status(status: str, **fields):
+    with _state_lock:
+        _state.update(status=status, **fields)
+    set_gauge("whisper_ready", 1 if status == READY else 0)
+    logger.info("Warm-up %s", status)
+
+
+def _warm(models: List[str]):
+    try:
+        _set_status(IMPORTING)
+        # Importing whisper imports torch; this is most of a cold start before
+        # any weights are read.
+        importlib.import_module("whisper.tokenizer")
+
+        from model_registry import get_registry
+        from transcriber import instrument_whisper
+        from worker_pool import TRANSCRIBE_WORKERS, get_pool
+        instrument_whisper()
+
+        _set_status(LOADING)
+        # Live transcription always runs in this process, so the default model
+        # is loaded here even when jobs go to the worker pool.
+        for model_name in models:
+            get_registry().get(model_name)
+        if TRANSCRIBE_WORKERS > 1:
+            for future in wait(get_pool().warm_up()).done:
+                future.result()
+        _set_status(READY, ready_at=time.time())
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        _set_status(FAILED, error=str(e))
+
+
+def start_warmup(models: List[str] = WARMUP_MODELS):
+    global _thread
+    with _state_lock:
+        if _thread is not None:
+            return
+        _state['started_at'] = time.time()
+        _thread = threading.Thread(target=_warm, args=(models,), name="model-warmup", daemon=True)
+    _thread.start()
+
+
+def readiness() -> Dict[str, Any]:
+    with _state_lock:
+        state = dict(_state)
+    if state['started_at'] is not None:
+        end = state['ready_at'] or time.time()
+        state['elapsed_seconds'] = round(end - state['started_at'], 1)
+    return state
+
+
+def is_ready() -> bool:
+    return readiness()['status'] == READY
+
+
+def _readyz():
+    state = readiness()
+    return (200 if state['status'] == READY else 503), f"{state['status']}\n"
+
+
+register_route('/readyz', _readyz)
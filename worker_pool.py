@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from audio_io import decode_file
+from language_id import window_language
+from metrics import annotate, merge_stages, trace
+from model_registry import DEFAULT_PRECISION, MODEL_MEMORY_BUDGET_MB, available_memory, estimate_nbytes
+from transcriber import MODEL_NAME, AudioTranscriber, summarize_result
+
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "1"))
+TORCH_THREADS_PER_WORKER = int(os.environ.get("TORCH_THREADS_PER_WORKER", "0"))
+TRACE_KEY = "_trace"
+
+_worker_transcriber: Optional[AudioTranscriber] = None
+
+
+def default_torch_threads(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(model_name: str, device: Optional[str], precision: Optional[str], torch_threads: int):
+    global _worker_transcriber
+    from model_registry import configure_cpu_threads
+    configure_cpu_threads(torch_threads)
+    _worker_transcriber = AudioTranscriber(model_name, device, precision)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _transcriber_for(model_name: Optional[str]) -> AudioTranscriber:
+    if model_name is None or model_name == _worker_transcriber.model_name:
+        return _worker_transcriber
+    # Other sizes come from the worker's own registry, which keeps them cached.
+    return AudioTranscriber(model_name, _worker_transcriber.device, _worker_transcriber.precision)
+
+
+def _run_file_job(path: str, language: Optional[str], checkpoint_key: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    transcriber = _transcriber_for(options.pop('model', None))
+    # Stage timings recorded in the worker are shipped back with the result so
+    # the parent's trace covers the whole job.
+    with trace("worker") as current:
+        result = transcriber.transcribe_resumable(decode_file(path), language, checkpoint_key, **options)
+    return {**result, TRACE_KEY: {'stages': dict(current.stages), 'attributes': current.attributes}}
+
+
+def _run_chunk_job(chunk: np.ndarray, language: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    transcriber = _transcriber_for(options.pop('model', None))
+    with trace("worker") as current:
+        result = summarize_result(transcriber.transcribe(chunk, language, **options))
+    return {**result, TRACE_KEY: {'stages': dict(current.stages), 'attributes': current.attributes}}
+
+
+def _run_language_job(window: np.ndarray, model_name: Optional[str]) -> Dict[str, Any]:
+    transcriber = _transcriber_for(model_name)
+    with trace("worker") as current:
+        language = window_language(transcriber, window)
+    return {'language': language, TRACE_KEY: {'stages': dict(current.stages), 'attributes': current.attributes}}
+
+
+def _run_batch_job(paths: List[str], language: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    transcriber = _transcriber_for(options.pop('model', None))
+    with trace("worker") as current:
+        outcomes = transcriber.transcribe_batch_files(paths, language, **options)
+    return {'outcomes': outcomes, TRACE_KEY: {'stages': dict(current.stages), 'attributes': current.attributes}}
+
+
+def merge_worker_trace(result: Dict[str, Any]) -> Dict[str, Any]:
+    worker = result.pop(TRACE_KEY, None)
+    if worker:
+        merge_stages(worker['stages'])
+        annotate(**worker['attributes'])
+    return result
+
+
+class TranscriptionPool:
+    def __init__(self, workers: int = TRANSCRIBE_WORKERS, torch_threads: int = TORCH_THREADS_PER_WORKER,
+                 model_name: str = MODEL_NAME, device: Optional[str] = None, precision: Optional[str] = None):
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads or default_torch_threads(self.workers)
+        self.config = (model_name, device, precision)
+        # Models the workers have been asked for, and so may each hold a copy of.
+        self.models: Set[str] = {model_name}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a process that already initialised torch threads can deadlock.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(*self.config, self.torch_threads),
+                )
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self.models = {self.config[0]}
+
+    def loaded_models(self) -> Tuple[Set[str], int]:
+        # Every worker loads its own copy of a model it is sent, so a new one
+        # has to fit once per worker: in what each worker's registry has left,
+        # and in an equal share of the host's free memory.
+        precision = self.config[2] or DEFAULT_PRECISION or "fp32"
+        with self._lock:
+            models = set(self.models)
+        free = MODEL_MEMORY_BUDGET_MB * 1024 * 1024 - sum(estimate_nbytes(name, precision) for name in models)
+        available = available_memory()
+        if available is not None:
+            free = min(free, available // self.workers)
+        return models, free
+
+    def _note_model(self, model_name: Optional[str]):
+        with self._lock:
+            self.models.add(model_name or self.config[0])
+
+    def warm_up(self) -> List[Future]:
+        # The executor starts a process for each submission that finds no idle
+        # worker, so one no-op per worker spawns them all and runs their model load.
+        executor = self._get_executor()
+        return [executor.submit(_ready) for _ in range(self.workers)]
+
+    def submit_file(self, path: str, language: Optional[str] = "en", checkpoint_key: Optional[str] = None,
+                    **options) -> Future:
+        self._note_model(options.get('model'))
+        return self._get_executor().submit(_run_file_job, path, language, checkpoint_key, options)
+
+    def submit_chunk(self, chunk: np.ndarray, language: Optional[str] = "en", **options) -> Future:
+        self._note_model(options.get('model'))
+        return self._get_executor().submit(_run_chunk_job, chunk, language, options)
+
+    def submit_language(self, window: np.ndarray, model_name: Optional[str] = None) -> Future:
+        self._note_model(model_name)
+        return self._get_executor().submit(_run_language_job, window, model_name)
+
+    def submit_batch(self, paths: List[str], language: Optional[str] = "en", **options) -> Future:
+        self._note_model(options.get('model'))
+        return self._get_executor().submit(_run_batch_job, paths, language, options)
+
+    def reset_if_broken(self) -> bool:
+        # A worker killed by the OOM killer or a segfault breaks the executor
+        # for good; every later submit raises BrokenProcessPool. Probing with a
+        # submit keeps this safe when several job threads see the same crash.
+        with self._lock:
+            if self._executor is None:
+                return False
+            try:
+                self._executor.submit(_ready)
+                return False
+            except BrokenProcessPool:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                return True
+
+    def shutdown(self):
+        self._reset()
+
+
+_pools: Dict[Tuple, TranscriptionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(workers: int = TRANSCRIBE_WORKERS, torch_threads: int = TORCH_THREADS_PER_WORKER,
+             model_name: str = MODEL_NAME, device: Optional[str] = None,
+             precision: Optional[str] = None) -> TranscriptionPool:
+    key = (workers, torch_threads, model_name, device, precision)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = TranscriptionPool(workers, torch_threads, model_name, device, precision)
+        return _pools[key]